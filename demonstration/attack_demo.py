@@ -235,10 +235,10 @@ def attack_3_privileged_insider():
     print_step("Insider retrieves fog node data from CS database")
     
     # Malicious insider extracts secrets
-    stored_fog_data = cs.fog_node_data[FID_j]
-    insider_PFD_j = stored_fog_data['PFD_j']
-    insider_b_j = stored_fog_data['b_j']
-    insider_K_cf = stored_fog_data['K_cf']
+    stored_fog_data = cs.store.get_fog_node(FID_j)
+    insider_PFD_j = stored_fog_data.PFD_j
+    insider_b_j = stored_fog_data.b_j
+    insider_K_cf = stored_fog_data.K_cf
     
     print_attack_detail("Extracted PFD_j", insider_PFD_j)
     print_attack_detail("Extracted b_j", insider_b_j)
@@ -378,10 +378,10 @@ def attack_4_fog_node_impersonation():
     try:
         # Store the values vehicle needs
         vehicle.RID_i = RID_i
-        vehicle.r_3_prime = xor_bytes(F_i, int_to_bytes(vehicle.Q_i.x)[:20])
+        vehicle.r_3_prime = xor_bytes(F_i, vehicle.Q_x[:20])
         
         # Vehicle computes J_i*
-        r3_xor_Qi = xor_bytes(vehicle.r_3_prime, int_to_bytes(vehicle.Q_i.x)[:20])
+        r3_xor_Qi = xor_bytes(vehicle.r_3_prime, vehicle.Q_x[:20])
         print_attack_detail("  r'_3 ⊕ Q_i", r3_xor_Qi)
         print_step("But r'_3 ⊕ Q_i = F_i (what vehicle sent in M1!)")
         print_attack_detail("  F_i (from M1)", F_i)
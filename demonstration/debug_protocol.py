@@ -48,7 +48,7 @@ print(f"  K_cf: {fog.K_cf.hex()}")
 # Now let's manually compute what CS should get
 from scheme.common import h, xor_bytes
 
-K_cf_cs = cs.fog_node_data[FID_j]['K_cf']
+K_cf_cs = cs.store.get_fog_node(FID_j).K_cf
 print(f"\n## Cloud Server Verification")
 print(f"K_cf (CS): {K_cf_cs.hex()}")
 
@@ -21,13 +21,13 @@ fog = FogNode(FID_j)
 fog.register(cs)
 
 print("## REGISTRATION PHASE")
-print(f"CS stored K_cf: {cs.fog_node_data[FID_j]['K_cf'].hex()}")
+print(f"CS stored K_cf: {cs.store.get_fog_node(FID_j).K_cf.hex()}")
 print(f"Fog stored K_cf: {fog.K_cf.hex()}")
-print(f"K_cf match: {cs.fog_node_data[FID_j]['K_cf'] == fog.K_cf}")
+print(f"K_cf match: {cs.store.get_fog_node(FID_j).K_cf == fog.K_cf}")
 
-print(f"\nCS stored PFD_j: {cs.fog_node_data[FID_j]['PFD_j'].hex()}")
+print(f"\nCS stored PFD_j: {cs.store.get_fog_node(FID_j).PFD_j.hex()}")
 print(f"Fog stored PFD_j: {fog.storage['PFD_j'].hex()}")
-print(f"PFD_j match: {cs.fog_node_data[FID_j]['PFD_j'] == fog.storage['PFD_j']}")
+print(f"PFD_j match: {cs.store.get_fog_node(FID_j).PFD_j == fog.storage['PFD_j']}")
 
 # Authentication
 vehicle.login_and_verify(VID_i, VPW_i)
@@ -85,7 +85,7 @@ print(f"D (from method): {D.hex()}")
 print(f"D match: {D == D_check}")
 
 print("\n\n## CLOUD SERVER M2 VERIFICATION")
-K_cf_cs = cs.fog_node_data[FID_j]['K_cf']
+K_cf_cs = cs.store.get_fog_node(FID_j).K_cf
 print(f"K_cf (CS): {K_cf_cs.hex()}")
 
 print("\n## Recovering r_4")
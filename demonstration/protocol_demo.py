@@ -220,19 +220,21 @@ def run_protocol_demo():
     print("\nSession Keys:")
     print_data("  Vehicle SK", vehicle.session_key)
     print_data("  Fog Node SK", fog.session_key)
-    print_data("  Cloud Server SK", cs.vehicle_data[VID_i]['session_key'] if VID_i in cs.vehicle_data and 'session_key' in cs.vehicle_data[VID_i] else b'[not stored]')
+    cs_record = cs.store.get_vehicle(VID_i)
+    cs_session_key = cs_record.session_key if cs_record else None
+    print_data("  Cloud Server SK", cs_session_key if cs_session_key else b'[not stored]')
     
     # Verify session keys match
     print("\nVerifying session key agreement...")
-    if vehicle.session_key == fog.session_key and vehicle.session_key == cs.vehicle_data[VID_i]['session_key']:
+    if vehicle.session_key == fog.session_key and vehicle.session_key == cs_session_key:
         print("  [+] SUCCESS: Vehicle, Fog Node, and Cloud Server share the same session key!")
     else:
         print("  [-] ERROR: Session keys do not match!")
         print(f"  Vehicle: {vehicle.session_key.hex()[:32]}...")
         print(f"  Fog:     {fog.session_key.hex()[:32]}...")
         # Cloud server may not store session_key for this VID (implementation choice)
-        if VID_i in cs.vehicle_data and 'session_key' in cs.vehicle_data[VID_i]:
-            print(f"  Cloud:   {cs.vehicle_data[VID_i]['session_key'].hex()[:32]}...")
+        if cs_session_key:
+            print(f"  Cloud:   {cs_session_key.hex()[:32]}...")
         else:
             print("  Cloud:   [not stored]")
     
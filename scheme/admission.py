@@ -0,0 +1,103 @@
+from collections import OrderedDict, deque
+from .common import current_time
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate, burst, now):
+        
+        # The clock is current_time(), which may step backwards; that refills nothing
+        self.tokens = min(burst, self.tokens + max(0, now - self.updated) * rate)
+        self.updated = max(self.updated, now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class AdmissionController:
+    # Bounded admission queue in front of FogNode.begin_sessions. offer() rejects an
+    # M1 before any EC work if its source is over its token-bucket rate, the queue
+    # is full, T_1 is stale or the message is a replay. drain() hands the queued
+    # M1s to the fog node as one batch.
+    def __init__(self, fog, max_queue=1024, rate=20.0, burst=40, max_sources=100_000):
+        self.fog = fog
+        self.max_queue = max_queue
+        self.rate = rate  # Tokens per second and source
+        self.burst = burst
+        self.max_sources = max_sources
+        self._buckets = OrderedDict()  # source -> TokenBucket, least recently seen first
+        self._queue = deque()
+        self.admitted = 0
+        self.shed = {'rate_limited': 0, 'queue_full': 0, 'stale': 0, 'replay': 0}
+        self.max_queue_depth = 0
+
+    def _take_token(self, source, now):
+        
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[source] = bucket
+            if len(self._buckets) > self.max_sources:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(source)
+        return bucket.take(self.rate, self.burst, now)
+
+    def _shed(self, reason, message):
+        
+        self.shed[reason] += 1
+        raise ValueError(message)
+
+    def offer(self, source, M1, ticket=None):
+        # Queues M1 (with an opaque ticket returned by drain) or raises ValueError
+        now = current_time()
+        if not self._take_token(source, now):
+            self._shed('rate_limited', "F_j: rate limit exceeded. Aborting.")
+        if len(self._queue) >= self.max_queue:
+            self._shed('queue_full', "F_j: overloaded. Aborting.")
+        now = int(now)
+        try:
+            self.fog.check_m1(M1, now, replay=False)
+        except ValueError as e:
+            self._shed('stale', str(e))
+        try:
+            self.fog.check_m1_replay(M1, now)
+        except ValueError as e:
+            self._shed('replay', str(e))
+        self._queue.append((ticket, M1))
+        self.admitted += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+
+    def drain(self, max_batch=None):
+        # Returns (ticket, session, M2) for queued M1s; session is None and M2 the error on failure
+        n = len(self._queue) if max_batch is None else min(max_batch, len(self._queue))
+        batch = [self._queue.popleft() for _ in range(n)]
+        results = self.fog.begin_sessions([M1 for _, M1 in batch], admitted=True)
+        return [(ticket, session, M2) for (ticket, _), (session, M2) in zip(batch, results)]
+
+    async def drain_async(self, max_batch=None):
+        # drain() for asyncio callers; see FogNode.begin_sessions_async
+        n = len(self._queue) if max_batch is None else min(max_batch, len(self._queue))
+        batch = [self._queue.popleft() for _ in range(n)]
+        results = await self.fog.begin_sessions_async([M1 for _, M1 in batch], admitted=True)
+        return [(ticket, session, M2) for (ticket, _), (session, M2) in zip(batch, results)]
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def metrics(self):
+        
+        return {
+            'queue_depth': len(self._queue),
+            'max_queue_depth': self.max_queue_depth,
+            'admitted': self.admitted,
+            'shed_total': sum(self.shed.values()),
+            **{f'shed_{reason}': count for reason, count in self.shed.items()},
+        }
@@ -0,0 +1,112 @@
+import struct
+from tinyec.ec import Point
+from .common import CURVE, int_to_bytes, bytes_to_int
+
+_P = CURVE.field.p
+
+# Frame: message type (1 byte), request id (4 bytes), payload length (4 bytes)
+FRAME_HEADER = struct.Struct('>BII')
+
+MSG_M1 = 0x01
+MSG_M2 = 0x02
+MSG_M3 = 0x03
+MSG_M4 = 0x04
+MSG_ERROR = 0x7F
+
+MAX_ERROR_SIZE = 1024  # Error payloads are short UTF-8 reasons
+
+COORDINATE_SIZE = 32
+POINT_SIZE = 1 + COORDINATE_SIZE  # SEC1 compressed: 0x02/0x03 parity prefix || x
+
+# Fixed field layouts (name, size in bytes). M2 carries FID_j, which the
+# protocol assumes CS learns from the channel.
+MESSAGE_LAYOUTS = {
+    MSG_M1: (('RID_i', 8), ('P_i', POINT_SIZE), ('F_i', 20), ('T_1', 4)),
+    MSG_M2: (('W_i', 20), ('X_i', 20), ('Y_i', 20), ('D', 20), ('T_2', 4), ('FID_j', 8)),
+    MSG_M3: (('L_i', 20), ('Z_i', 20), ('T_3', 4)),
+    MSG_M4: (('N_i', 20), ('J_i', 20), ('T_4', 4)),
+}
+
+
+def encode_point(P):
+    
+    return bytes((2 | (P.y & 1),)) + int_to_bytes(P.x, COORDINATE_SIZE)
+
+def decode_point(data):
+    
+    prefix = data[0]
+    if prefix not in (2, 3):
+        raise ValueError(f"Unsupported point encoding prefix {prefix:#04x}")
+    x = bytes_to_int(data[1:POINT_SIZE])
+    if x >= _P:
+        raise ValueError("Point x-coordinate out of range")
+    rhs = (x * x * x + CURVE.a * x + CURVE.b) % _P
+    y = pow(rhs, (_P + 1) // 4, _P)  # p = 3 (mod 4) for secp256r1
+    if y * y % _P != rhs:
+        raise ValueError("Point is not on the curve")
+    if (y & 1) != (prefix & 1):
+        y = _P - y
+    return Point(CURVE, x, y)
+
+def encode_message(msg_type, fields):
+    
+    layout = MESSAGE_LAYOUTS[msg_type]
+    if len(fields) != len(layout):
+        raise ValueError(f"Message {msg_type:#04x} expects {len(layout)} fields, got {len(fields)}")
+    parts = []
+    for (name, size), value in zip(layout, fields):
+        if name == 'P_i':
+            value = encode_point(value)
+        if len(value) != size:
+            raise ValueError(f"Field {name} must be {size} bytes, got {len(value)}")
+        parts.append(value)
+    return b''.join(parts)
+
+def message_size(msg_type):
+    
+    return sum(size for _, size in MESSAGE_LAYOUTS[msg_type])
+
+def decode_message(msg_type, payload):
+    # Fields other than P_i are memoryview slices of payload (no copies); callers
+    # that keep or concatenate a field beyond the call should take bytes() of it.
+    layout = MESSAGE_LAYOUTS[msg_type]
+    payload = memoryview(payload)
+    expected = message_size(msg_type)
+    if len(payload) != expected:
+        raise ValueError(f"Message {msg_type:#04x} must be {expected} bytes, got {len(payload)}")
+    fields = []
+    offset = 0
+    for name, size in layout:
+        value = payload[offset:offset + size]
+        fields.append(decode_point(value) if name == 'P_i' else value)
+        offset += size
+    return tuple(fields)
+
+def encode_frame(msg_type, request_id, payload):
+    
+    return FRAME_HEADER.pack(msg_type, request_id, len(payload)) + payload
+
+def max_payload_size(msg_type):
+    # Largest payload accepted for msg_type, or None for an unknown type
+    if msg_type == MSG_ERROR:
+        return MAX_ERROR_SIZE
+    if msg_type in MESSAGE_LAYOUTS:
+        return message_size(msg_type)
+    return None
+
+async def read_frame(reader):
+    # Returns (msg_type, request_id, payload), or None once the peer closes.
+    # The length field is checked against the message type before anything is
+    # read, so a peer cannot make us buffer an arbitrary payload.
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except EOFError:
+        return None
+    msg_type, request_id, length = FRAME_HEADER.unpack(header)
+    limit = max_payload_size(msg_type)
+    if limit is None:
+        raise ValueError(f"Unknown message type {msg_type:#04x}")
+    if length > limit:
+        raise ValueError(f"Message {msg_type:#04x} payload of {length} bytes exceeds {limit}")
+    payload = await reader.readexactly(length)
+    return msg_type, request_id, payload
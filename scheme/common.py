@@ -1,5 +1,14 @@
 import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from pathlib import Path
 from tinyec import registry
+from tinyec.ec import Point, Inf
+from .ec import affine_add, to_affine, jacobian_add_affine, jacobian_scalar_mult
 import secrets
 
 def get_curve(name='secp256r1'):
@@ -10,12 +19,168 @@ CURVE = get_curve()
 G = CURVE.g  # Generator of the elliptic curve group
 ORDER = CURVE.field.n  # Order of the curve
 DELTA_T = 10  # Timestamp validity period in seconds
+RESUMPTION_LIFETIME = 3600  # Resumption ticket validity period in seconds
+_P = CURVE.field.p
+_A = CURVE.a
+
+_clock = time.time
+
+def current_time():
+    # Wall-clock seconds used for timestamps, freshness checks and ticket expiry
+    return _clock()
+
+def set_clock(clock=None):
+    # Replaces the clock, e.g. with a simulated one; None restores time.time
+    global _clock
+    _clock = clock if clock is not None else time.time
+
+class OperationCounter:
+    # Primitive operations (hash, scalar_mult, xor, nonce) per (entity, phase). Entity
+    # methods marked with instrumented_phase set the scope; anything else is 'unattributed'.
+    # point_add counts the additions made inside scalar multiplications by the pure
+    # Python arithmetic (the protocol itself adds no points); OpenSSL calls report none, and
+    # neither do executor worker processes.
+    def __init__(self):
+        self.counts = {}  # (entity, phase) -> {operation: count}
+        self.scope = ('unattributed', 'unattributed')
+
+    def add(self, operation, n=1):
+        ops = self.counts.setdefault(self.scope, {})
+        ops[operation] = ops.get(operation, 0) + n
+
+    def by_entity(self, phases=None):
+        # {entity: {operation: count}}, optionally limited to some phases
+        totals = {}
+        for (entity, phase), ops in self.counts.items():
+            if phases is None or phase in phases:
+                entity_ops = totals.setdefault(entity, {})
+                for operation, n in ops.items():
+                    entity_ops[operation] = entity_ops.get(operation, 0) + n
+        return totals
+
+    def as_dict(self):
+        # {entity: {phase: {operation: count}}}
+        result = {}
+        for (entity, phase), ops in self.counts.items():
+            result.setdefault(entity, {})[phase] = dict(ops)
+        return result
+
+_op_counter = None  # Installed by count_operations; None disables counting
+
+@contextmanager
+def count_operations():
+    
+    global _op_counter
+    previous, _op_counter = _op_counter, OperationCounter()
+    try:
+        yield _op_counter
+    finally:
+        _op_counter = previous
+
+def count_operation(operation, n=1):
+    # For work done outside these helpers, e.g. scalar multiplications in worker processes
+    if _op_counter is not None:
+        _op_counter.add(operation, n)
+
+class Tracer:
+    # Spans recorded as Chrome trace "complete" events (open the JSON in Perfetto or
+    # chrome://tracing). Timestamps are microseconds from the tracer's creation.
+    def __init__(self):
+        self.events = []
+        self._origin = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def begin(self):
+        return time.perf_counter_ns()
+
+    def end(self, name, category, start, args=None):
+        now = time.perf_counter_ns()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self._origin) / 1000,
+            'dur': (now - start) / 1000,
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def to_chrome_trace(self):
+        return {'traceEvents': self.events, 'displayTimeUnit': 'ms'}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+_tracer = None  # Installed by trace_operations; None disables tracing
+
+@contextmanager
+def trace_operations(path=None):
+    # Records a span for every instrumented entity method and for the hashes and
+    # scalar multiplications inside it; writes the trace to path on exit if given
+    global _tracer
+    previous, _tracer = _tracer, Tracer()
+    tracer = _tracer
+    try:
+        yield tracer
+    finally:
+        _tracer = previous
+        if path is not None:
+            tracer.save(path)
+
+def instrumented_phase(phase):
+    # Attributes the operations of an entity method to (ENTITY, phase) for counting and
+    # records a span for it when tracing; both are skipped when neither is installed
+    def decorate(method):
+        name = method.__name__
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            counter, tracer = _op_counter, _tracer
+            if counter is None and tracer is None:
+                return method(self, *args, **kwargs)
+            if counter is not None:
+                previous, counter.scope = counter.scope, (self.ENTITY, phase)
+            start = tracer.begin() if tracer is not None else 0
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                if tracer is not None:
+                    tracer.end(f"{self.ENTITY}.{name}", 'phase', start, {'phase': phase})
+                if counter is not None:
+                    counter.scope = previous
+        return wrapper
+    return decorate
+
+_sha256 = hashlib.sha256
 
 def h(data):
     
+    if _op_counter is not None:
+        _op_counter.add('hash')
     if isinstance(data, str):
         data = data.encode('utf-8')
-    return hashlib.sha256(data).digest()[:20]  # Truncate to 160 bits
+    if _tracer is not None:
+        start = _tracer.begin()
+        digest = _sha256(data).digest()[:20]
+        _tracer.end('h', 'primitive', start)
+        return digest
+    return _sha256(data).digest()[:20]  # Truncate to 160 bits
+
+def h_batch(items):
+    
+    if _op_counter is not None:
+        _op_counter.add('hash', len(items))
+    if _tracer is not None:
+        return _traced('h_batch', _h_batch, items)
+    return _h_batch(items)
+
+def _h_batch(items):
+    
+    return [_sha256(data.encode('utf-8') if isinstance(data, str) else data).digest()[:20] for data in items]
 
 def int_to_bytes(i, length=None):
     
@@ -29,12 +194,36 @@ def bytes_to_int(b):
 
 def xor_bytes(b1, b2):
     
-    if len(b1) != len(b2):
-        raise ValueError(f"XOR requires equal length inputs: {len(b1)} != {len(b2)}")
-    return bytes(a ^ b for a, b in zip(b1, b2))
+    if _op_counter is not None:
+        _op_counter.add('xor')
+    n = len(b1)
+    if n != len(b2):
+        raise ValueError(f"XOR requires equal length inputs: {n} != {len(b2)}")
+    return (int.from_bytes(b1, 'big') ^ int.from_bytes(b2, 'big')).to_bytes(n, 'big')
+
+def xor_bytes_batch(items, masks):
+    # XORs items[k] with masks[k], or with masks itself when it is a single byte string.
+    # All inputs are packed into one integer so the XOR runs as a single operation.
+    if not items:
+        return []
+    if _op_counter is not None:
+        _op_counter.add('xor', len(items))
+    n = len(items[0])
+    if isinstance(masks, (bytes, bytearray, memoryview)):
+        masks = [masks] * len(items)
+    elif len(masks) != len(items):
+        raise ValueError(f"XOR batch requires as many masks as items: {len(items)} != {len(masks)}")
+    for b1, b2 in zip(items, masks):
+        if len(b1) != n or len(b2) != n:
+            raise ValueError(f"XOR batch requires equal length inputs of {n} bytes")
+    total = n * len(items)
+    packed = (int.from_bytes(b''.join(items), 'big') ^ int.from_bytes(b''.join(masks), 'big')).to_bytes(total, 'big')
+    return [packed[k:k + n] for k in range(0, total, n)]
 
 def random_nonce(length=20):
     
+    if _op_counter is not None:
+        _op_counter.add('nonce', max(1, length // 20))  # One per 160 bits drawn
     return secrets.token_bytes(length)
 
 def pad_to_length(data, length):
@@ -42,5 +231,252 @@ def pad_to_length(data, length):
     if isinstance(data, str):
         data = data.encode('utf-8')
     if len(data) >= length:
-        return data[:length]
-    return data + b'\x00' * (length - len(data))
+        return bytes(data[:length])
+    return bytes(data).ljust(length, b'\x00')
+
+
+def derive_resumption_ticket(session_key):
+    # Returns (TID, RMS): the public ticket id and the resumption secret
+    RMS = h(session_key + b'resumption')
+    return h(RMS + b'ticket'), RMS
+
+def derive_handover_ticket(session_key, FID_next):
+    # Resumption ticket for the fog node FID_next, derived from a session with its neighbour
+    RMS = h(session_key + pad_to_length(FID_next, 8) + b'handover')
+    return h(RMS + b'ticket'), RMS
+
+
+def _to_point(R):
+    
+    if R is None:
+        return Inf(CURVE)
+    return Point(CURVE, R[0], R[1])
+
+
+class FixedBaseTable:
+    # Windowed fixed-base multiplication: rows[i][d - 1] = d * 2^(window * i) * base,
+    # so k * base is one table lookup and one addition per window of k.
+    def __init__(self, base, window=4, cache_path=None):
+        self.base = base
+        self.window = window
+        self.n_windows = (ORDER.bit_length() + window - 1) // window
+        self.rows = None
+        self.cache_path = Path(cache_path) if cache_path else None
+
+    def _build(self):
+        rows = []
+        P = (self.base.x, self.base.y)
+        for _ in range(self.n_windows):
+            row = [P]
+            for _ in range((1 << self.window) - 2):
+                row.append(affine_add(row[-1], P, _P, _A))
+            rows.append(row)
+            for _ in range(self.window):
+                P = affine_add(P, P, _P, _A)
+        return rows
+
+    def _load(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (cached.get('curve') != CURVE.name or cached.get('window') != self.window
+                or cached.get('base') != [self.base.x, self.base.y]):
+            return None
+        return [[tuple(P) for P in row] for row in cached['rows']]
+
+    def _save(self, rows):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'curve': CURVE.name,
+                'window': self.window,
+                'base': [self.base.x, self.base.y],
+                'rows': rows,
+            }, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def precompute(self):
+        
+        if self.rows is not None:
+            return self
+        rows = self._load() if self.cache_path else None
+        if rows is None:
+            rows = self._build()
+            if self.cache_path:
+                try:
+                    self._save(rows)
+                except OSError:
+                    pass  # The cache is an optimisation only
+        self.rows = rows
+        return self
+
+    def multiply(self, k, jacobian=True):
+        # With jacobian=False every addition is affine (one inversion each)
+        k %= ORDER
+        if self.rows is None:
+            self.precompute()
+        mask = (1 << self.window) - 1
+        add = jacobian_add_affine if jacobian else affine_add
+        R = None
+        adds = 0
+        for row in self.rows:
+            d = k & mask
+            if d:
+                R = add(R, row[d - 1], _P, _A)
+                adds += 1
+            k >>= self.window
+            if not k:
+                break
+        if _op_counter is not None:
+            _op_counter.add('point_add', adds)
+        if jacobian:
+            R = to_affine(R, _P)
+        return _to_point(R)
+
+
+# Table for G, built lazily on first use. Set RIS_G_TABLE_CACHE to a file path to
+# persist it across processes.
+G_TABLE = FixedBaseTable(G, cache_path=os.environ.get('RIS_G_TABLE_CACHE'))
+
+
+_SM_WINDOW = 4  # Window of jacobian_scalar_mult
+
+def _window_additions(k, window):
+    # Additions jacobian_scalar_mult makes: its table of 2P..15P, then one per non-zero window
+    if k == 0:
+        return 0
+    adds = (1 << window) - 2
+    mask = (1 << window) - 1
+    while k:
+        if k & mask:
+            adds += 1
+        k >>= window
+    return adds
+
+
+class TinyecProvider:
+    # Reference arithmetic: tinyec affine points, one inversion per addition
+    name = 'tinyec'
+
+    def scalar_mult(self, k, P):
+        # tinyec's double-and-add makes one addition per set bit of k
+        if _op_counter is not None:
+            _op_counter.add('point_add', bin(k).count('1'))
+        return k * P
+
+    def mul_G(self, k):
+        
+        return G_TABLE.multiply(k, jacobian=False)
+
+    def ecdh_x(self, k, P):
+        # x-coordinate of k * P, encoded the way the protocol truncates it
+        return int_to_bytes(self.scalar_mult(k, P).x)
+
+
+class JacobianProvider(TinyecProvider):
+    # Jacobian coordinates, a single inversion when converting the result back
+    name = 'pure-jacobian'
+
+    def scalar_mult(self, k, P):
+        
+        if isinstance(P, Inf):
+            return P
+        k %= ORDER
+        if _op_counter is not None:
+            _op_counter.add('point_add', _window_additions(k, _SM_WINDOW))
+        R = jacobian_scalar_mult(k, (P.x, P.y), _P, _A, window=_SM_WINDOW)
+        return _to_point(to_affine(R, _P))
+
+    def mul_G(self, k):
+        
+        return G_TABLE.multiply(k, jacobian=True)
+
+
+class NativeProvider(JacobianProvider):
+    # OpenSSL-backed keys from the cryptography package. Only k * G and the
+    # ECDH x-coordinate are available natively; general k * P falls back to Jacobian.
+    name = 'native'
+
+    def __init__(self):
+        from cryptography.hazmat.primitives.asymmetric import ec
+        self._ec = ec
+        self._curve = ec.SECP256R1()
+        self._public_key = lru_cache(maxsize=256)(self._load_public_key)
+
+    def _load_public_key(self, x, y):
+        
+        return self._ec.EllipticCurvePublicNumbers(x, y, self._curve).public_key()
+
+    def mul_G(self, k):
+        
+        k %= ORDER
+        if k == 0:
+            return Inf(CURVE)
+        numbers = self._ec.derive_private_key(k, self._curve).public_key().public_numbers()
+        return Point(CURVE, numbers.x, numbers.y)
+
+    def ecdh_x(self, k, P):
+        
+        k %= ORDER
+        if k == 0 or isinstance(P, Inf):
+            return super().ecdh_x(k, P)
+        shared = self._ec.derive_private_key(k, self._curve).exchange(self._ec.ECDH(), self._public_key(P.x, P.y))
+        return int_to_bytes(bytes_to_int(shared))
+
+
+PROVIDERS = {
+    TinyecProvider.name: TinyecProvider,
+    JacobianProvider.name: JacobianProvider,
+    NativeProvider.name: NativeProvider,
+}
+
+_provider = None
+
+def set_provider(name):
+    
+    global _provider
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown crypto provider '{name}'. Available: {', '.join(PROVIDERS)}")
+    _provider = PROVIDERS[name]()
+    return _provider
+
+def get_provider():
+    
+    if _provider is None:
+        set_provider(os.environ.get('RIS_CRYPTO_PROVIDER', JacobianProvider.name))
+    return _provider
+
+def _traced(name, function, *args):
+    
+    start = _tracer.begin()
+    try:
+        return function(*args)
+    finally:
+        _tracer.end(name, 'primitive', start)
+
+def scalar_mult(k, P):
+    
+    if _op_counter is not None:
+        _op_counter.add('scalar_mult')
+    if _tracer is not None:
+        return _traced('scalar_mult', get_provider().scalar_mult, k, P)
+    return get_provider().scalar_mult(k, P)
+
+def mul_G(k):
+    
+    if _op_counter is not None:
+        _op_counter.add('scalar_mult')
+    if _tracer is not None:
+        return _traced('mul_G', get_provider().mul_G, k)
+    return get_provider().mul_G(k)
+
+def ecdh_x(k, P):
+    
+    if _op_counter is not None:
+        _op_counter.add('scalar_mult')
+    if _tracer is not None:
+        return _traced('ecdh_x', get_provider().ecdh_x, k, P)
+    return get_provider().ecdh_x(k, P)
@@ -1,47 +1,180 @@
-import time
-from .common import h, G, xor_bytes, int_to_bytes, bytes_to_int, random_nonce, DELTA_T, pad_to_length
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from tinyec.ec import Point
+from .common import h, h_batch, CURVE, mul_G, xor_bytes, xor_bytes_batch, int_to_bytes, bytes_to_int, random_nonce, DELTA_T, pad_to_length, get_provider, set_provider, current_time, instrumented_phase
+from .storage import MemoryStore, VehicleRecord, FogNodeRecord
+from .replay import message_digest
+
+
+def _derive_vehicle(K_c, VID_i, PV_i):
+    
+    a_i = int_to_bytes(bytes_to_int(h(VID_i + PV_i + K_c)), 20)  # Fixed width, so leading zero bytes are kept
+    # A_i = a_i_int * G  # This is never used, as per instructions
+    MV_i = xor_bytes(a_i, PV_i)
+    return a_i, MV_i
+
+def _derive_fog_node(K_c, FID_j):
+    
+    r_2 = random_nonce()
+    PFD_j = h(FID_j + r_2)
+    b_j_int = bytes_to_int(h(PFD_j + K_c))
+    B_j = mul_G(b_j_int)
+    K_cf = h(xor_bytes(pad_to_length(FID_j, 20), K_c))
+    return PFD_j, int_to_bytes(b_j_int, 20), K_cf, B_j
+
+# Bulk registration workers receive K_c once, from the pool initializer
+_worker_K_c = None
+
+def _init_bulk_worker(K_c, provider_name):
+    
+    global _worker_K_c
+    _worker_K_c = K_c
+    set_provider(provider_name)
+
+def _bulk_derive_vehicles(entries, K_c=None):
+    
+    K_c = _worker_K_c if K_c is None else K_c
+    return [_derive_vehicle(K_c, VID_i, PV_i) for VID_i, PV_i in entries]
+
+def _bulk_derive_fog_nodes(FIDs, K_c=None):
+    # Points are returned as coordinates, which pickle far smaller than tinyec Points
+    K_c = _worker_K_c if K_c is None else K_c
+    results = []
+    for FID_j in FIDs:
+        PFD_j, b_j, K_cf, B_j = _derive_fog_node(K_c, FID_j)
+        results.append((PFD_j, b_j, K_cf, (B_j.x, B_j.y)))
+    return results
+
+
+class FogNodeKeys:
+    # Per-fog-node values handle_m2 needs on every message; they depend only on FID_j and K_cf
+    __slots__ = ('K_cf', 'W_mask', 'K_cf_xor_FID')
+
+    def __init__(self, FID_j, K_cf):
+        FID_pad = pad_to_length(FID_j, 20)
+        self.K_cf = K_cf
+        self.W_mask = h(K_cf + FID_pad)  # h(K_cf || FID_j)
+        self.K_cf_xor_FID = xor_bytes(K_cf, FID_pad)  # K_cf xor FID_j
+
 
 class CloudServer:
-    def __init__(self, k_c):
+    ENTITY = 'cloud_server'
+
+    def __init__(self, k_c, store=None, fog_key_cache_size=4096, replay_cache=None):
         self.K_c = k_c  # Master secret key
-        self.vehicle_data = {}
-        self.fog_node_data = {}
+        self.store = store if store is not None else MemoryStore()  # Vehicle and fog node registry
+        # LRU of FogNodeKeys; cold fog nodes are evicted and rebuilt from the store
+        self.fog_key_cache_size = fog_key_cache_size
+        self._fog_keys = OrderedDict()
+        self.replay_cache = replay_cache  # Optional ReplayCache, may be shared with fog nodes
+
+    def _cache_fog_keys(self, FID_j, K_cf):
+        
+        keys = FogNodeKeys(FID_j, K_cf)
+        self._fog_keys[FID_j] = keys
+        self._fog_keys.move_to_end(FID_j)
+        while len(self._fog_keys) > self.fog_key_cache_size:
+            self._fog_keys.popitem(last=False)
+        return keys
 
+    def fog_node_keys(self, FID_j):
+        # Raises ValueError if FID_j is not registered
+        keys = self._fog_keys.get(FID_j)
+        if keys is not None:
+            self._fog_keys.move_to_end(FID_j)
+            return keys
+        fog_record = self.store.get_fog_node(FID_j)
+        if fog_record is None:
+            raise ValueError("Fog node not registered.")
+        return self._cache_fog_keys(FID_j, fog_record.K_cf)
+
+    @instrumented_phase('registration')
     def register_vehicle(self, VID_i, PV_i):
         
-        a_i_int = bytes_to_int(h(VID_i + PV_i + self.K_c))
-        # A_i = a_i_int * G  # This is never used, as per instructions
-        MV_i = xor_bytes(int_to_bytes(a_i_int), PV_i)
+        a_i, MV_i = _derive_vehicle(self.K_c, VID_i, PV_i)
         
         # Store for later verification if needed, though not specified
-        self.vehicle_data[VID_i] = {'PV_i': PV_i, 'a_i': int_to_bytes(a_i_int)}
+        self.store.put_vehicle(VehicleRecord(VID_i, PV_i, a_i))
         
         return MV_i
 
+    @instrumented_phase('registration')
     def register_fog_node(self, FID_j):
         
-        r_2 = random_nonce()
-        PFD_j = h(FID_j + r_2)
-        b_j_int = bytes_to_int(h(PFD_j + self.K_c))
-        B_j = b_j_int * G
-        K_cf = h(xor_bytes(pad_to_length(FID_j, 20), self.K_c))
+        PFD_j, b_j, K_cf, B_j = _derive_fog_node(self.K_c, FID_j)
 
-        self.fog_node_data[FID_j] = {'PFD_j': PFD_j, 'b_j': int_to_bytes(b_j_int), 'K_cf': K_cf}
+        self.store.put_fog_node(FogNodeRecord(FID_j, PFD_j, b_j, K_cf))
+        self._cache_fog_keys(FID_j, K_cf)
         
-        return PFD_j, int_to_bytes(b_j_int), K_cf, B_j
+        return PFD_j, b_j, K_cf, B_j
 
-    def handle_m2(self, W_i, X_i, Y_i, D, T_2, FID_j):
+    @instrumented_phase('handover')
+    def provision_handover_key(self, FID_a, FID_b):
+        # Pairwise key for neighbouring fog nodes, delivered to both over the
+        # registration channel (FogNode.add_neighbour)
+        for FID_j in (FID_a, FID_b):
+            if self.store.get_fog_node(FID_j) is None:
+                raise ValueError("Fog node not registered.")
+        low, high = sorted((FID_a, FID_b))
+        return h(low + high + self.K_c + b'handover')
+
+    def _bulk_pool(self, workers):
         
-        if abs(int(time.time()) - bytes_to_int(T_2)) > DELTA_T:
-            raise ValueError("CS: T2 is not fresh. Aborting.")
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_bulk_worker,
+            initargs=(self.K_c, get_provider().name),
+        )
 
-        # Assuming CS knows FID_j from the communication channel
-        if FID_j not in self.fog_node_data:
-            raise ValueError("Fog node not registered.")
+    def _derive_bulk(self, items, derive, workers, chunk_size):
+        # Streams results for items in order, keeping at most a few chunks in flight
+        chunks = itertools.batched(items, chunk_size)
+        if not workers:
+            for chunk in chunks:
+                yield chunk, derive(chunk, self.K_c)
+            return
+        with self._bulk_pool(workers) as pool:
+            in_flight = []
+            for chunk in chunks:
+                in_flight.append((chunk, pool.submit(derive, chunk)))
+                if len(in_flight) >= 2 * workers:
+                    chunk, future = in_flight.pop(0)
+                    yield chunk, future.result()
+            for chunk, future in in_flight:
+                yield chunk, future.result()
+
+    def register_vehicles_bulk(self, entries, workers=None, chunk_size=1024):
+        # entries yields (VID_i, PV_i); yields (VID_i, MV_i) in the same order
+        for chunk, derived in self._derive_bulk(entries, _bulk_derive_vehicles, workers, chunk_size):
+            for (VID_i, PV_i), (a_i, MV_i) in zip(chunk, derived):
+                self.store.put_vehicle(VehicleRecord(VID_i, PV_i, a_i))
+                yield VID_i, MV_i
 
-        K_cf = self.fog_node_data[FID_j]['K_cf']
+    def register_fog_nodes_bulk(self, FIDs, workers=None, chunk_size=64):
+        # Yields (FID_j, PFD_j, b_j, K_cf, B_j) per FID_j, in the same order
+        for chunk, derived in self._derive_bulk(FIDs, _bulk_derive_fog_nodes, workers, chunk_size):
+            for FID_j, (PFD_j, b_j, K_cf, B_j) in zip(chunk, derived):
+                B_j = Point(CURVE, *B_j)
+                self.store.put_fog_node(FogNodeRecord(FID_j, PFD_j, b_j, K_cf))
+                self._cache_fog_keys(FID_j, K_cf)
+                yield FID_j, PFD_j, b_j, K_cf, B_j
+
+    @staticmethod
+    def _check_m2_fields(W_i, X_i, Y_i, D, FID_j):
+        # Rejects wrong field lengths before the replay cache records the message
+        if len(W_i) != 20 or len(X_i) != 20 or len(Y_i) != 20 or len(D) != 20 or len(FID_j) != 8:
+            raise ValueError("CS: malformed M2. Aborting.")
+
+    def _process_m2(self, W_i, X_i, Y_i, D, T_2, FID_j, keys, now, r_5):
+        # The caller has already checked T_2 freshness
+        self._check_m2_fields(W_i, X_i, Y_i, D, FID_j)
+        if self.replay_cache is not None:
+            self.replay_cache.admit(message_digest(W_i, X_i, Y_i, D, T_2, FID_j), bytes_to_int(T_2), now)
+
+        K_cf = keys.K_cf
         
-        r_4_star = xor_bytes(W_i, h(K_cf + pad_to_length(FID_j, 20)))
+        r_4_star = xor_bytes(W_i, keys.W_mask)
         PFD_j_star = xor_bytes(X_i, h(FID_j + xor_bytes(K_cf, r_4_star)))
         R_i_star = xor_bytes(Y_i, h(K_cf + r_4_star))
         
@@ -50,8 +183,7 @@ class CloudServer:
         if D_star != D:
             raise ValueError("CS: D* verification failed. Aborting.")
 
-        r_5 = random_nonce()  # 20 bytes
-        T_3 = int_to_bytes(int(time.time()), 4)  # 32 bits = 4 bytes
+        T_3 = int_to_bytes(now, 4)  # 32 bits = 4 bytes
 
         SK = h(PFD_j_star + R_i_star + r_4_star + xor_bytes(r_5, K_cf))
 
@@ -60,14 +192,95 @@ class CloudServer:
         VID_i_star = xor_bytes(real_R_i, FID_j)
 
         # Store session key for verification
-        if VID_i_star in self.vehicle_data:
-            self.vehicle_data[VID_i_star]['session_key'] = SK
-        
-        # # Store session key for verification
-        # if R_i_star[:8] in self.vehicle_data:
-        #     self.vehicle_data[R_i_star[:8]]['session_key'] = SK
+        self.store.set_session_key(VID_i_star, SK)
         
-        Z_i = h(SK + xor_bytes(K_cf, pad_to_length(FID_j, 20)))
-        L_i = xor_bytes(r_5, h(xor_bytes(K_cf, pad_to_length(FID_j, 20)) + r_4_star))
+        Z_i = h(SK + keys.K_cf_xor_FID)
+        L_i = xor_bytes(r_5, h(keys.K_cf_xor_FID + r_4_star))
 
         return L_i, Z_i, T_3
+
+    @instrumented_phase('M3')
+    def handle_m2(self, W_i, X_i, Y_i, D, T_2, FID_j):
+        
+        now = int(current_time())
+        # Checked before the fog node key lookup, which may go to the store
+        if abs(now - bytes_to_int(T_2)) > DELTA_T:
+            raise ValueError("CS: T2 is not fresh. Aborting.")
+
+        # Assuming CS knows FID_j from the communication channel
+        keys = self.fog_node_keys(FID_j)
+        r_5 = random_nonce()  # 20 bytes
+
+        return self._process_m2(W_i, X_i, Y_i, D, T_2, FID_j, keys, now, r_5)
+
+    def _process_m2_group(self, batch, FID_j, keys, now, nonces):
+        # _process_m2 for M2s from one fog node, one step at a time across the group
+        # so the hashes and XORs run through h_batch and xor_bytes_batch.
+        # batch holds (index, M2) pairs; returns (index, M3 or ValueError) pairs.
+        results = []
+        live = []
+        for i, (W_i, X_i, Y_i, D, T_2, _) in batch:
+            try:
+                if abs(now - bytes_to_int(T_2)) > DELTA_T:
+                    raise ValueError("CS: T2 is not fresh. Aborting.")
+                self._check_m2_fields(W_i, X_i, Y_i, D, FID_j)
+                if self.replay_cache is not None:
+                    self.replay_cache.admit(message_digest(W_i, X_i, Y_i, D, T_2, FID_j), bytes_to_int(T_2), now)
+                live.append((i, W_i, X_i, Y_i, D))
+            except ValueError as e:
+                results.append((i, e))
+        if not live:
+            return results
+
+        K_cf = keys.K_cf
+        indices, W, X, Y, D = zip(*live)
+        r_4 = xor_bytes_batch(W, keys.W_mask)
+        PFD_j = xor_bytes_batch(X, h_batch([FID_j + k for k in xor_bytes_batch(r_4, K_cf)]))
+        R_i = xor_bytes_batch(Y, h_batch([K_cf + r for r in r_4]))
+        D_star = h_batch([p + r + k for p, r, k in zip(PFD_j, r_4, xor_bytes_batch(R_i, K_cf))])
+
+        verified = []
+        for k, i in enumerate(indices):
+            if D_star[k] != D[k]:
+                results.append((i, ValueError("CS: D* verification failed. Aborting.")))
+            else:
+                verified.append(k)
+        if not verified:
+            return results
+
+        T_3 = int_to_bytes(now, 4)  # 32 bits = 4 bytes
+        r_5 = [nonces[20 * indices[k]:20 * indices[k] + 20] for k in verified]
+        SK = h_batch([PFD_j[k] + R_i[k] + r_4[k] + x
+                      for k, x in zip(verified, xor_bytes_batch(r_5, K_cf))])
+        VID_i = xor_bytes_batch([R_i[k][:8] for k in verified], FID_j)
+        for VID_i_star, SK_i in zip(VID_i, SK):
+            self.store.set_session_key(VID_i_star, SK_i)
+
+        Z_i = h_batch([SK_i + keys.K_cf_xor_FID for SK_i in SK])
+        L_i = xor_bytes_batch(r_5, h_batch([keys.K_cf_xor_FID + r_4[k] for k in verified]))
+        for k, L, Z in zip(verified, L_i, Z_i):
+            results.append((indices[k], (L, Z, T_3)))
+        return results
+
+    @instrumented_phase('M3')
+    def handle_m2_batch(self, batch_of_m2):
+        # batch_of_m2 holds (W_i, X_i, Y_i, D, T_2, FID_j) tuples, possibly from
+        # different fog nodes. Returns one M3 tuple, or the ValueError, per item.
+        now = int(current_time())
+        nonces = random_nonce(20 * len(batch_of_m2))  # One draw for every r_5
+
+        by_fog_node = {}
+        for i, M2 in enumerate(batch_of_m2):
+            by_fog_node.setdefault(M2[5], []).append((i, M2))
+
+        results = [None] * len(batch_of_m2)
+        for FID_j, batch in by_fog_node.items():
+            try:
+                keys = self.fog_node_keys(FID_j)
+            except ValueError as e:
+                for i, _ in batch:
+                    results[i] = e
+                continue
+            for i, result in self._process_m2_group(batch, FID_j, keys, now, nonces):
+                results[i] = result
+        return results
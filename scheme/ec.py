@@ -0,0 +1,126 @@
+# Elliptic curve arithmetic on short Weierstrass curves y^2 = x^3 + ax + b (mod p).
+# Affine points are (x, y) tuples, Jacobian points are (X, Y, Z) tuples with
+# x = X / Z^2, y = Y / Z^3. None is the point at infinity in both representations.
+
+
+def affine_add(P, Q, p, a):
+    
+    if P is None:
+        return Q
+    if Q is None:
+        return P
+    if P[0] == Q[0]:
+        if (P[1] + Q[1]) % p == 0:
+            return None
+        m = (3 * P[0] * P[0] + a) * pow(2 * P[1], -1, p) % p
+    else:
+        m = (Q[1] - P[1]) * pow(Q[0] - P[0], -1, p) % p
+    x = (m * m - P[0] - Q[0]) % p
+    return x, (m * (P[0] - x) - P[1]) % p
+
+
+def to_jacobian(P):
+    
+    if P is None:
+        return None
+    return P[0], P[1], 1
+
+
+def to_affine(P, p):
+    
+    if P is None:
+        return None
+    X, Y, Z = P
+    z_inv = pow(Z, -1, p)
+    z_inv2 = z_inv * z_inv % p
+    return X * z_inv2 % p, Y * z_inv2 * z_inv % p
+
+
+def jacobian_double(P, p, a):
+    
+    if P is None:
+        return None
+    X, Y, Z = P
+    if Y == 0:
+        return None
+    YY = Y * Y % p
+    S = 4 * X * YY % p
+    ZZ = Z * Z % p
+    M = (3 * X * X + a * ZZ * ZZ) % p
+    X3 = (M * M - 2 * S) % p
+    Y3 = (M * (S - X3) - 8 * YY * YY) % p
+    Z3 = 2 * Y * Z % p
+    return X3, Y3, Z3
+
+
+def jacobian_add_affine(P, Q, p, a):
+    # Mixed addition: P is Jacobian, Q is affine
+    if Q is None:
+        return P
+    if P is None:
+        return to_jacobian(Q)
+    X1, Y1, Z1 = P
+    Z1Z1 = Z1 * Z1 % p
+    U2 = Q[0] * Z1Z1 % p
+    S2 = Q[1] * Z1 * Z1Z1 % p
+    H = (U2 - X1) % p
+    r = (S2 - Y1) % p
+    if H == 0:
+        if r == 0:
+            return jacobian_double(P, p, a)
+        return None
+    HH = H * H % p
+    HHH = H * HH % p
+    V = X1 * HH % p
+    X3 = (r * r - HHH - 2 * V) % p
+    Y3 = (r * (V - X3) - Y1 * HHH) % p
+    Z3 = Z1 * H % p
+    return X3, Y3, Z3
+
+
+def jacobian_add(P, Q, p, a):
+    
+    if P is None:
+        return Q
+    if Q is None:
+        return P
+    X1, Y1, Z1 = P
+    X2, Y2, Z2 = Q
+    Z1Z1 = Z1 * Z1 % p
+    Z2Z2 = Z2 * Z2 % p
+    U1 = X1 * Z2Z2 % p
+    U2 = X2 * Z1Z1 % p
+    S1 = Y1 * Z2 * Z2Z2 % p
+    S2 = Y2 * Z1 * Z1Z1 % p
+    H = (U2 - U1) % p
+    r = (S2 - S1) % p
+    if H == 0:
+        if r == 0:
+            return jacobian_double(P, p, a)
+        return None
+    HH = H * H % p
+    HHH = H * HH % p
+    V = U1 * HH % p
+    X3 = (r * r - HHH - 2 * V) % p
+    Y3 = (r * (V - X3) - S1 * HHH) % p
+    Z3 = Z1 * Z2 * H % p
+    return X3, Y3, Z3
+
+
+def jacobian_scalar_mult(k, P, p, a, window=4):
+    # Fixed-window multiplication of the affine point P, result in Jacobian
+    if P is None or k == 0:
+        return None
+    table = [None, to_jacobian(P)]
+    for _ in range((1 << window) - 2):
+        table.append(jacobian_add_affine(table[-1], P, p, a))
+    mask = (1 << window) - 1
+    n_windows = (k.bit_length() + window - 1) // window
+    R = None
+    for i in reversed(range(n_windows)):
+        for _ in range(window):
+            R = jacobian_double(R, p, a)
+        d = (k >> (i * window)) & mask
+        if d:
+            R = jacobian_add(R, table[d], p, a)
+    return R
@@ -0,0 +1,77 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from tinyec.ec import Point
+from .common import CURVE, ecdh_x, get_provider, set_provider
+
+# Scalar held by each worker process, loaded once by the pool initializer
+_worker_scalar = None
+
+
+def _init_worker(scalar, provider_name):
+    
+    global _worker_scalar
+    _worker_scalar = scalar
+    set_provider(provider_name)
+
+def _worker_ready():
+    
+    return None
+
+def _worker_ecdh_x(xy):
+    
+    return ecdh_x(_worker_scalar, Point(CURVE, *xy))
+
+def _worker_ecdh_x_chunk(chunk):
+    
+    return [ecdh_x(_worker_scalar, Point(CURVE, *xy)) for xy in chunk]
+
+
+class ScalarMultExecutor:
+    # Computes ecdh_x(scalar, P) for many points on a pool of worker processes.
+    # Points cross the process boundary as (x, y) tuples; the scalar never does per task.
+    def __init__(self, scalar, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(scalar, get_provider().name),
+        )
+        # Fork every worker now: a worker forked later inherits whatever sockets are open
+        # at that moment and keeps them alive after the gateway closes its end
+        for future in [self.pool.submit(_worker_ready) for _ in range(self.workers)]:
+            future.result()
+
+    def ecdh_x_many(self, points):
+        
+        if not points:
+            return []
+        chunksize = max(1, len(points) // (self.workers * 4))
+        return list(self.pool.map(_worker_ecdh_x, [(P.x, P.y) for P in points], chunksize=chunksize))
+
+    def ecdh_x_many_async(self, points):
+        # Same as ecdh_x_many without blocking: returns an awaitable of the results.
+        # Call from a running event loop.
+        return asyncio.ensure_future(self._gather([(P.x, P.y) for P in points]))
+
+    async def _gather(self, coords):
+        
+        if not coords:
+            return []
+        chunksize = max(1, len(coords) // (self.workers * 4))
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(*(
+            asyncio.wrap_future(self.pool.submit(_worker_ecdh_x_chunk, coords[i:i + chunksize]), loop=loop)
+            for i in range(0, len(coords), chunksize)
+        ))
+        return [x for chunk in chunks for x in chunk]
+
+    def shutdown(self):
+        
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
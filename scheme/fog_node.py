@@ -1,31 +1,102 @@
+import asyncio
+import os
 import time
 import secrets
-from .common import h, G, CURVE, xor_bytes, int_to_bytes, bytes_to_int, random_nonce, DELTA_T, pad_to_length
+from collections import OrderedDict
+from tinyec.ec import Point
+from .common import h, G, CURVE, ecdh_x, xor_bytes, int_to_bytes, bytes_to_int, random_nonce, DELTA_T, RESUMPTION_LIFETIME, pad_to_length, derive_resumption_ticket, derive_handover_ticket, current_time, instrumented_phase, count_operation
+from .executor import ScalarMultExecutor
+from .replay import message_digest
+
+
+class FogSession:
+    # Per-handshake state between M1 and M4
+    __slots__ = ('RID_i', 'R_i', 'Q_x', 'r_3_prime', 'r_4', 'session_key')
+
+    def __init__(self, RID_i, R_i, Q_x, r_3_prime, r_4):
+        self.RID_i = RID_i
+        self.R_i = R_i
+        self.Q_x = Q_x
+        self.r_3_prime = r_3_prime
+        self.r_4 = r_4
+        self.session_key = None
+
+
+class FogSecrets:
+    # Unwrapped fog node secrets and the values derived from them that are the
+    # same for every session
+    __slots__ = ('b_j_int', 'K_cf', 'W_mask', 'K_cf_xor_FID', 'expires_at')
+
+    def __init__(self, b_j_int, K_cf, W_mask, K_cf_xor_FID, expires_at):
+        self.b_j_int = b_j_int
+        self.K_cf = K_cf
+        self.W_mask = W_mask  # h(K_cf || FID_j)
+        self.K_cf_xor_FID = K_cf_xor_FID  # K_cf xor FID_j
+        self.expires_at = expires_at
+
+    def wipe(self):
+        # Byte values are held in bytearrays so they can be zeroed in place
+        for value in (self.K_cf, self.W_mask, self.K_cf_xor_FID):
+            value[:] = bytes(len(value))
+        self.b_j_int = 0
+        self.expires_at = 0
+
+
+def _session_field(name):
+    return property(lambda self: getattr(self.session, name) if self.session else None)
+
 
 class FogNode:
-    def __init__(self, FID_j):
+    ENTITY = 'fog_node'
+
+    __slots__ = ('FID_j', 'storage', 'session_key', 'session', 'b_j', 'K_cf', 'PFD_j', 'executor', '_executor_workers',
+                 'secret_ttl', '_secrets', '_wipe_handle', 'replay_cache', 'resumption_lifetime', 'max_tickets', '_tickets', 'neighbours',
+                 '_imported')
+
+    # Single-handshake API (generate_m2/generate_m4) exposes the latest session's state
+    r_4 = _session_field('r_4')
+    R_i = _session_field('R_i')
+    Q_x = _session_field('Q_x')
+    RID_i = _session_field('RID_i')
+    r_3_prime = _session_field('r_3_prime')
+
+    def __init__(self, FID_j, secret_ttl=None, replay_cache=None, resumption_lifetime=None, max_tickets=100_000):
         # FID must be 8 bytes (64 bits) as per scheme specification
         if isinstance(FID_j, str):
             FID_j = FID_j.encode()[:8].ljust(8, b'\x00')
         self.FID_j = FID_j
         self.storage = {}
         self.session_key = None
+        self.session = None
         self.b_j = None
         self.K_cf = None
         self.PFD_j = None
-        self.r_4 = None
-        self.R_i = None
-        self.Q_i = None
-        self.RID_i = None
-        self.r_3_prime = None
+        self.executor = None
+        self._executor_workers = None  # Set while start_executor is in effect
+        # Seconds an unwrapped FogSecrets stays cached; None unwraps on every message.
+        # With a TTL, b_j and K_cf are only ever held unwrapped inside a FogSecrets.
+        self.secret_ttl = secret_ttl
+        self._secrets = None
+        self._wipe_handle = None  # Event loop timer ending the current epoch
+        self.replay_cache = replay_cache  # Optional ReplayCache, may be shared with CS
+        # Resumption tickets (TID -> (RMS, expires_at)), oldest first; None disables resumption
+        self.resumption_lifetime = resumption_lifetime
+        self.max_tickets = max_tickets
+        self._tickets = OrderedDict()
+        self.neighbours = {}  # FID of a neighbouring fog node -> handover key from CS
+        # Imported handover TIDs -> T_h + DELTA_T, oldest first; a replayed
+        # handover message must not reinstall a ticket that was already used
+        self._imported = OrderedDict()
 
+    @instrumented_phase('registration')
     def register(self, cs):
         
         PFD_j, b_j, K_cf, B_j = cs.register_fog_node(self.FID_j)
         
         self.PFD_j = PFD_j
-        self.b_j = b_j
-        self.K_cf = K_cf
+        if not self.secret_ttl:
+            self.b_j = b_j
+            self.K_cf = K_cf
         
         Rb_j = xor_bytes(b_j, h(self.FID_j + K_cf))
         RK_cf = xor_bytes(K_cf, pad_to_length(self.FID_j, 20))
@@ -36,49 +107,317 @@ class FogNode:
         self.storage['B_j'] = B_j # Public key
 
     def _recover_secrets(self):
+        # Returns (b_j, K_cf) unwrapped from storage
+        K_cf = xor_bytes(self.storage['RK_cf'], pad_to_length(self.FID_j, 20))
+        b_j = xor_bytes(self.storage['Rb_j'], h(self.FID_j + K_cf))
+        return b_j, K_cf
+
+    def _unwrap_secrets(self):
         
-        self.K_cf = xor_bytes(self.storage['RK_cf'], pad_to_length(self.FID_j, 20))
-        self.b_j = xor_bytes(self.storage['Rb_j'], h(self.FID_j + self.K_cf))
+        now = time.monotonic()
+        if self._secrets is not None:
+            if now < self._secrets.expires_at:
+                return self._secrets
+            self.wipe_secrets()
 
-    def generate_m2(self, RID_i, P_i, F_i, T_1):
+        b_j, K_cf = self._recover_secrets()
+        FID_pad = pad_to_length(self.FID_j, 20)
+        unwrapped = FogSecrets(
+            bytes_to_int(b_j),
+            bytearray(K_cf),
+            bytearray(h(K_cf + FID_pad)),
+            bytearray(xor_bytes(K_cf, FID_pad)),
+            now + (self.secret_ttl or 0),
+        )
+        if self.secret_ttl:
+            self._secrets = unwrapped
+            self._schedule_wipe(unwrapped)
+        return unwrapped
+
+    def _schedule_wipe(self, unwrapped):
+        # Inside an event loop the epoch ends on time even if no message arrives. The
+        # callback runs on the loop thread, never in the middle of a handshake step.
+        # Without a running loop the wipe is lazy: expired secrets (and the worker
+        # pool holding b_j) stay in memory until the next message or wipe_secrets().
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wipe_handle = loop.call_later(self.secret_ttl, self._expire_secrets, unwrapped)
+
+    def _expire_secrets(self, unwrapped):
         
-        if abs(int(time.time()) - bytes_to_int(T_1)) > DELTA_T:
+        if self._secrets is unwrapped:
+            self.wipe_secrets()
+
+    def wipe_secrets(self):
+        # Ends the current epoch; the next message unwraps the secrets again. The
+        # worker processes hold b_j as well, so the pool is stopped and restarted
+        # with the next epoch's secrets on first use.
+        if self._wipe_handle is not None:
+            self._wipe_handle.cancel()
+            self._wipe_handle = None
+        if self._secrets is not None:
+            self._secrets.wipe()
+            self._secrets = None
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def start_executor(self, workers=None):
+        # Moves b_j * P_i onto a process pool; each worker unwraps b_j once.
+        # Call before opening sockets: forked workers keep copies of any already open.
+        self.shutdown_executor()
+        self._executor_workers = workers or os.cpu_count() or 1
+        self.executor = ScalarMultExecutor(self._unwrap_secrets().b_j_int, self._executor_workers)
+        return self.executor
+
+    def shutdown_executor(self):
+        
+        self._executor_workers = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def _check_replay(self, message, timestamp, now):
+        
+        if self.replay_cache is not None:
+            self.replay_cache.admit(message_digest(*message), bytes_to_int(timestamp), now)
+
+    def check_m1(self, M1, now, replay=True):
+        # Cheap checks that run before any EC work; raises ValueError. The message is
+        # validated before the replay cache records it, so a malformed M1 cannot poison
+        # a batch. replay=False leaves the replay check to check_m1_replay.
+        RID_i, P_i, F_i, T_1 = M1
+        if len(RID_i) != 8 or len(F_i) != 20 or len(T_1) != 4:
+            raise ValueError("F_j: malformed M1. Aborting.")
+        if not isinstance(P_i, Point) or not CURVE.on_curve(P_i.x, P_i.y):
+            raise ValueError("F_j: P_i is not a curve point. Aborting.")
+        if abs(now - bytes_to_int(T_1)) > DELTA_T:
             raise ValueError("F_j: T1 is not fresh. Aborting.")
+        if replay:
+            self._check_replay(M1, T_1, now)
+
+    def check_m1_replay(self, M1, now):
+        # Records M1 in the replay cache; raises ValueError if it was seen before
+        self._check_replay(M1, M1[3], now)
+
+    def _pool(self, b_j_int):
+        # The worker pool from start_executor, restarted if an epoch wipe stopped it
+        if self.executor is None:
+            self.executor = ScalarMultExecutor(b_j_int, self._executor_workers)
+        return self.executor
+
+    def _compute_q_x(self, b_j_int, points):
+        # x-coordinates of Q_i = b_j * P_i
+        if self._executor_workers is not None:
+            count_operation('scalar_mult', len(points))
+            return self._pool(b_j_int).ecdh_x_many(points)
+        return [ecdh_x(b_j_int, P_i) for P_i in points]
 
-        self._recover_secrets()
+    def _begin_session(self, RID_i, F_i, Q_x, now, keys):
         
-        self.Q_i = bytes_to_int(self.b_j) * P_i
-        self.r_3_prime = xor_bytes(F_i, int_to_bytes(self.Q_i.x)[:20])  # Truncate Q_i.x to 20 bytes
-        self.R_i = xor_bytes(RID_i, int_to_bytes(self.Q_i.x)[:8])  # Truncate Q_i.x to 8 bytes
-        self.RID_i = RID_i
+        r_3_prime = xor_bytes(F_i, Q_x[:20])  # Truncate Q_i.x to 20 bytes
+        R_i = xor_bytes(RID_i, Q_x[:8])  # Truncate Q_i.x to 8 bytes
+        r_4 = random_nonce()  # 20 bytes
+        session = FogSession(RID_i, R_i, Q_x, r_3_prime, r_4)
 
-        self.r_4 = random_nonce()  # 20 bytes
-        T_2 = int_to_bytes(int(time.time()), 4)  # 32 bits = 4 bytes
+        T_2 = int_to_bytes(now, 4)  # 32 bits = 4 bytes
 
-        W_i = xor_bytes(self.r_4, h(self.K_cf + pad_to_length(self.FID_j, 20)))
-        X_i = xor_bytes(self.storage['PFD_j'], h(self.FID_j + xor_bytes(self.K_cf, self.r_4)))
-        Y_i = xor_bytes(pad_to_length(self.R_i, 20), h(self.K_cf + self.r_4))  # Pad R_i to 20 bytes
-        D = h(self.storage['PFD_j'] + self.r_4 + xor_bytes(pad_to_length(self.R_i, 20), self.K_cf))  # Pad R_i to 20 bytes
+        W_i = xor_bytes(r_4, keys.W_mask)
+        X_i = xor_bytes(self.storage['PFD_j'], h(self.FID_j + xor_bytes(keys.K_cf, r_4)))
+        Y_i = xor_bytes(pad_to_length(R_i, 20), h(keys.K_cf + r_4))  # Pad R_i to 20 bytes
+        D = h(self.storage['PFD_j'] + r_4 + xor_bytes(pad_to_length(R_i, 20), keys.K_cf))  # Pad R_i to 20 bytes
 
-        return W_i, X_i, Y_i, D, T_2
+        return session, (W_i, X_i, Y_i, D, T_2)
 
-    def generate_m4(self, L_i, Z_i, T_3):
+    def _complete_session(self, session, L_i, Z_i, T_3, now, keys):
         
-        if abs(int(time.time()) - bytes_to_int(T_3)) > DELTA_T:
+        if abs(now - bytes_to_int(T_3)) > DELTA_T:
             raise ValueError("F_j: T3 is not fresh. Aborting.")
+        self._check_replay((L_i, Z_i, T_3), T_3, now)
 
-        r_5_star = xor_bytes(L_i, h(xor_bytes(self.K_cf, pad_to_length(self.FID_j, 20)) + self.r_4))
-        SK_star = h(self.storage['PFD_j'] + pad_to_length(self.R_i, 20) + self.r_4 + xor_bytes(r_5_star, self.K_cf))  # Pad R_i to 20 bytes
+        r_5_star = xor_bytes(L_i, h(keys.K_cf_xor_FID + session.r_4))
+        SK_star = h(self.storage['PFD_j'] + pad_to_length(session.R_i, 20) + session.r_4 + xor_bytes(r_5_star, keys.K_cf))  # Pad R_i to 20 bytes
         
-        Z_i_star = h(SK_star + xor_bytes(self.K_cf, pad_to_length(self.FID_j, 20)))
+        Z_i_star = h(SK_star + keys.K_cf_xor_FID)
 
         if Z_i_star != Z_i:
             raise ValueError("F_j: Z_i* verification failed. Aborting.")
 
-        self.session_key = SK_star
-        T_4 = int_to_bytes(int(time.time()), 4)  # 32 bits = 4 bytes
+        session.session_key = SK_star
+        self._issue_ticket(SK_star)
+        T_4 = int_to_bytes(now, 4)  # 32 bits = 4 bytes
 
-        J_i = h(self.RID_i + xor_bytes(self.r_3_prime, int_to_bytes(self.Q_i.x)[:20]))  # Truncate Q_i.x to 20 bytes
-        N_i = xor_bytes(h(xor_bytes(pad_to_length(self.FID_j, 20), int_to_bytes(self.Q_i.x)[:20]) + self.R_i), self.session_key)  # Truncate Q_i.x to 20 bytes
+        J_i = h(session.RID_i + xor_bytes(session.r_3_prime, session.Q_x[:20]))  # Truncate Q_i.x to 20 bytes
+        N_i = xor_bytes(h(xor_bytes(pad_to_length(self.FID_j, 20), session.Q_x[:20]) + session.R_i), SK_star)  # Truncate Q_i.x to 20 bytes
 
         return N_i, J_i, T_4
+
+    def _store_ticket(self, TID, RMS, lifetime):
+        
+        now = current_time()
+        while self._tickets and next(iter(self._tickets.values()))[1] <= now:
+            self._tickets.popitem(last=False)
+        self._tickets[TID] = (RMS, now + lifetime)
+        self._tickets.move_to_end(TID)
+        while len(self._tickets) > self.max_tickets:
+            self._tickets.popitem(last=False)
+
+    def _issue_ticket(self, session_key):
+        
+        if self.resumption_lifetime:
+            self._store_ticket(*derive_resumption_ticket(session_key), self.resumption_lifetime)
+
+    def add_neighbour(self, FID_k, K_handover):
+        
+        self.neighbours[FID_k] = K_handover
+
+    @instrumented_phase('handover')
+    def export_handover(self, session_key, FID_next):
+        # Context that lets the neighbour FID_next resume this vehicle's session.
+        # The derived secret is masked and authenticated under the pairwise handover key.
+        if FID_next not in self.neighbours:
+            raise ValueError("F_j: no handover key for the next fog node.")
+        K_ab = self.neighbours[FID_next]
+        TID, RMS = derive_handover_ticket(session_key, FID_next)
+        T_h = int_to_bytes(int(current_time()), 4)  # 32 bits = 4 bytes
+        C = xor_bytes(RMS, h(K_ab + TID + T_h))
+        tag = h(K_ab + self.FID_j + TID + C + T_h)
+        return self.FID_j, TID, C, T_h, tag
+
+    @instrumented_phase('handover')
+    def import_handover(self, FID_prev, TID, C, T_h, tag, lifetime=None):
+        # Installs the context from export_handover as a resumption ticket
+        if abs(int(current_time()) - bytes_to_int(T_h)) > DELTA_T:
+            raise ValueError("F_j: T_h is not fresh. Aborting.")
+        if FID_prev not in self.neighbours:
+            raise ValueError("F_j: no handover key for the previous fog node.")
+        K_ab = self.neighbours[FID_prev]
+        if h(K_ab + FID_prev + TID + C + T_h) != tag:
+            raise ValueError("F_j: handover tag verification failed. Aborting.")
+        self._admit_handover(TID, bytes_to_int(T_h))
+        RMS = xor_bytes(C, h(K_ab + TID + T_h))
+        self._store_ticket(TID, RMS, lifetime or self.resumption_lifetime or RESUMPTION_LIFETIME)
+
+    def _admit_handover(self, TID, T_h):
+        # Each TID is imported once; it is remembered for as long as T_h is fresh
+        now = int(current_time())
+        while self._imported and next(iter(self._imported.values())) < now:
+            self._imported.popitem(last=False)
+        if TID in self._imported:
+            raise ValueError("F_j: handover replay detected. Aborting.")
+        self._imported[TID] = T_h + DELTA_T
+        while len(self._imported) > self.max_tickets:
+            self._imported.popitem(last=False)
+
+    @instrumented_phase('resumption')
+    def resume_session(self, TID, n_v, T_r, A_v):
+        # Answers Vehicle.resume_request without the CS; each ticket is single-use.
+        # Returns (session_key, (n_f, T_f, A_f)) so concurrent resumptions keep their own keys.
+        now = int(current_time())
+        if abs(now - bytes_to_int(T_r)) > DELTA_T:
+            raise ValueError("F_j: T_r is not fresh. Aborting.")
+
+        ticket = self._tickets.get(TID)
+        if ticket is None or ticket[1] <= current_time():
+            raise ValueError("F_j: unknown or expired resumption ticket. Aborting.")
+        RMS = ticket[0]
+        if h(RMS + TID + n_v + T_r) != A_v:
+            raise ValueError("F_j: A_v verification failed. Aborting.")
+        del self._tickets[TID]
+
+        n_f = random_nonce()  # 20 bytes
+        T_f = int_to_bytes(now, 4)  # 32 bits = 4 bytes
+        session_key = h(RMS + n_v + n_f)
+        self._issue_ticket(session_key)
+        A_f = h(session_key + n_f + T_f)
+
+        return session_key, (n_f, T_f, A_f)
+
+    def _check_batch(self, batch_of_m1, now, admitted):
+        # Per-item checks; returns the results list with rejected items filled in,
+        # and the indices of the M1s that passed
+        results = [None] * len(batch_of_m1)
+        fresh = []
+        for i, M1 in enumerate(batch_of_m1):
+            try:
+                self.check_m1(M1, now, replay=not admitted)
+                fresh.append(i)
+            except ValueError as e:
+                results[i] = (None, e)
+        return results, fresh
+
+    def _open_sessions(self, batch_of_m1, results, fresh, Q_xs, now, keys):
+        
+        for i, Q_x in zip(fresh, Q_xs):
+            RID_i, _, F_i, _ = batch_of_m1[i]
+            results[i] = self._begin_session(RID_i, F_i, Q_x, now, keys)
+        return results
+
+    @instrumented_phase('M2')
+    def begin_sessions(self, batch_of_m1, admitted=False):
+        # Returns one (session, M2) pair per M1, or (None, error) for rejected ones.
+        # admitted=True skips the replay check an AdmissionController already did.
+        keys = self._unwrap_secrets()
+        now = int(current_time())
+        results, fresh = self._check_batch(batch_of_m1, now, admitted)
+        Q_xs = self._compute_q_x(keys.b_j_int, [batch_of_m1[i][1] for i in fresh])
+        return self._open_sessions(batch_of_m1, results, fresh, Q_xs, now, keys)
+
+    @instrumented_phase('M2')
+    def _submit_batch(self, batch_of_m1, now, admitted):
+        # First half of begin_sessions_async: the checks, then b_j * P_i handed to the pool
+        results, fresh = self._check_batch(batch_of_m1, now, admitted)
+        count_operation('scalar_mult', len(fresh))
+        pending = self._pool(self._unwrap_secrets().b_j_int).ecdh_x_many_async([batch_of_m1[i][1] for i in fresh])
+        return results, fresh, pending
+
+    @instrumented_phase('M2')
+    def _finish_batch(self, batch_of_m1, results, fresh, Q_xs, now):
+        # The epoch may have ended while the pool was busy; b_j is the same in the
+        # next one, so only the per-epoch keys are fetched again
+        return self._open_sessions(batch_of_m1, results, fresh, Q_xs, now, self._unwrap_secrets())
+
+    async def begin_sessions_async(self, batch_of_m1, admitted=False):
+        # begin_sessions for asyncio callers. With start_executor the scalar
+        # multiplications are awaited instead of blocking the event loop, so
+        # concurrent batches overlap across the worker processes.
+        if self._executor_workers is None:
+            return self.begin_sessions(batch_of_m1, admitted)
+        now = int(current_time())
+        results, fresh, pending = self._submit_batch(batch_of_m1, now, admitted)
+        Q_xs = await pending
+        return self._finish_batch(batch_of_m1, results, fresh, Q_xs, now)
+
+    @instrumented_phase('M4')
+    def complete_sessions(self, batch_of_m3):
+        # Takes (session, M3) pairs and returns one M4, or the error, per pair
+        now = int(current_time())
+        keys = self._unwrap_secrets()
+
+        results = []
+        for session, (L_i, Z_i, T_3) in batch_of_m3:
+            try:
+                results.append(self._complete_session(session, L_i, Z_i, T_3, now, keys))
+            except ValueError as e:
+                results.append(e)
+        return results
+
+    @instrumented_phase('M2')
+    def generate_m2(self, RID_i, P_i, F_i, T_1):
+        
+        now = int(current_time())
+        self.check_m1((RID_i, P_i, F_i, T_1), now)
+        keys = self._unwrap_secrets()
+        Q_x, = self._compute_q_x(keys.b_j_int, [P_i])
+        self.session, M2 = self._begin_session(RID_i, F_i, Q_x, now, keys)
+        return M2
+
+    @instrumented_phase('M4')
+    def generate_m4(self, L_i, Z_i, T_3):
+        
+        keys = self._unwrap_secrets()
+        M4 = self._complete_session(self.session, L_i, Z_i, T_3, int(current_time()), keys)
+        self.session_key = self.session.session_key
+        return M4
@@ -0,0 +1,224 @@
+import asyncio
+import itertools
+from .codec import (
+    MSG_M1, MSG_M2, MSG_M3, MSG_M4, MSG_ERROR,
+    encode_frame, encode_message, decode_message, read_frame,
+)
+
+# Addresses are (host, port) tuples for TCP or a filesystem path for Unix sockets
+
+
+async def start_server(handler, address):
+    
+    if isinstance(address, tuple):
+        return await asyncio.start_server(handler, *address)
+    return await asyncio.start_unix_server(handler, address)
+
+async def open_connection(address):
+    
+    if isinstance(address, tuple):
+        return await asyncio.open_connection(*address)
+    return await asyncio.open_unix_connection(address)
+
+def server_address(server, address):
+    # Resolves the bound TCP port when the server was started on port 0
+    if isinstance(address, tuple):
+        return server.sockets[0].getsockname()[:2]
+    return address
+
+def _error_frame(request_id, error):
+    
+    return encode_frame(MSG_ERROR, request_id, str(error).encode('utf-8'))
+
+
+class CloudServerGateway:
+    # Serves M2 -> M3 for any number of fog node connections
+    def __init__(self, cs):
+        self.cs = cs
+        self.server = None
+        self.address = None
+
+    async def start(self, address=('127.0.0.1', 0)):
+        
+        self.server = await start_server(self.handle_connection, address)
+        self.address = server_address(self.server, address)
+        return self.address
+
+    async def close(self):
+        
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        
+        try:
+            while (frame := await read_frame(reader)) is not None:
+                msg_type, request_id, payload = frame
+                try:
+                    if msg_type != MSG_M2:
+                        raise ValueError(f"CS: unexpected message type {msg_type:#04x}")
+                    *M2, FID_j = decode_message(MSG_M2, payload)
+                    M3 = self.cs.handle_m2(*M2, bytes(FID_j))
+                    writer.write(encode_frame(MSG_M3, request_id, encode_message(MSG_M3, M3)))
+                except ValueError as e:
+                    writer.write(_error_frame(request_id, e))
+                await writer.drain()
+        except ValueError as e:
+            # Malformed frame header; the stream cannot be resynchronised
+            writer.write(_error_frame(0, e))
+        finally:
+            writer.close()
+
+
+class FogNodeGateway:
+    # Serves vehicles (M1 -> M4) and pipelines their M2s to CS over one connection.
+    # With an AdmissionController, M1s are admitted per peer and processed in batches.
+    def __init__(self, fog, cs_address, admission=None):
+        self.fog = fog
+        self.cs_address = cs_address
+        self.admission = admission
+        self._admission_ready = asyncio.Event()
+        self._admission_task = None
+        self.server = None
+        self.address = None
+        self._cs_writer = None
+        self._cs_reader_task = None
+        self._pending = {}
+        self._request_ids = itertools.count(1)
+
+    async def start(self, address=('127.0.0.1', 0)):
+        
+        reader, self._cs_writer = await open_connection(self.cs_address)
+        self._cs_reader_task = asyncio.create_task(self._read_cs_responses(reader))
+        if self.admission is not None:
+            self._admission_task = asyncio.create_task(self._run_admission())
+        self.server = await start_server(self.handle_connection, address)
+        self.address = server_address(self.server, address)
+        return self.address
+
+    async def close(self):
+        
+        self.server.close()
+        await self.server.wait_closed()
+        self._cs_writer.close()
+        self._cs_reader_task.cancel()
+        if self._admission_task is not None:
+            self._admission_task.cancel()
+
+    async def _run_admission(self):
+        # Drains the admission queue one batch at a time
+        while True:
+            await self._admission_ready.wait()
+            self._admission_ready.clear()
+            while self.admission.queue_depth:
+                for future, session, M2 in await self.admission.drain_async():
+                    if future.done():
+                        continue
+                    if session is None:
+                        future.set_exception(M2)
+                    else:
+                        future.set_result((session, M2))
+                await asyncio.sleep(0)  # Let connections queue the next batch
+
+    async def _begin_session(self, M1, source):
+        
+        if self.admission is None:
+            session, M2 = (await self.fog.begin_sessions_async([M1]))[0]
+            if session is None:
+                raise M2
+            return session, M2
+        future = asyncio.get_running_loop().create_future()
+        self.admission.offer(source, M1, future)
+        self._admission_ready.set()
+        return await future
+
+    async def _read_cs_responses(self, reader):
+        # Whatever ends the loop (EOF, a malformed frame, a reset or cancellation),
+        # every M2 still waiting for its M3 fails instead of hanging
+        try:
+            while (frame := await read_frame(reader)) is not None:
+                msg_type, request_id, payload = frame
+                future = self._pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if msg_type == MSG_M3:
+                    future.set_result(decode_message(MSG_M3, payload))
+                else:
+                    future.set_exception(ValueError(payload.decode('utf-8', 'replace')))
+        except (ValueError, ConnectionError, EOFError):
+            pass  # Malformed frame or broken connection to CS
+        finally:
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection to CS closed."))
+
+    async def forward_m2(self, M2):
+        
+        if self._cs_reader_task is None or self._cs_reader_task.done():
+            raise ConnectionError("Connection to CS closed.")
+        request_id = next(self._request_ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        payload = encode_message(MSG_M2, (*M2, self.fog.FID_j))
+        self._cs_writer.write(encode_frame(MSG_M2, request_id, payload))
+        await self._cs_writer.drain()
+        return await future
+
+    async def _authenticate(self, request_id, payload, writer, source):
+        
+        try:
+            RID_i, P_i, F_i, T_1 = decode_message(MSG_M1, payload)
+            # RID_i outlives the frame in the session record
+            session, M2 = await self._begin_session((bytes(RID_i), P_i, F_i, T_1), source)
+            M3 = await self.forward_m2(M2)
+            M4 = self.fog.complete_sessions([(session, M3)])[0]
+            if isinstance(M4, Exception):
+                raise M4
+            writer.write(encode_frame(MSG_M4, request_id, encode_message(MSG_M4, M4)))
+        except (ValueError, ConnectionError) as e:
+            writer.write(_error_frame(request_id, e))
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        
+        tasks = set()
+        source = writer.get_extra_info('peername') or writer.get_extra_info('sockname')
+        if isinstance(source, tuple):
+            source = source[0]  # Rate-limit per host, not per ephemeral port
+        try:
+            try:
+                while (frame := await read_frame(reader)) is not None:
+                    msg_type, request_id, payload = frame
+                    if msg_type != MSG_M1:
+                        writer.write(_error_frame(request_id, f"F_j: unexpected message type {msg_type:#04x}"))
+                        await writer.drain()
+                        continue
+                    task = asyncio.create_task(self._authenticate(request_id, payload, writer, source))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            except ValueError as e:
+                # Malformed frame header; the stream cannot be resynchronised
+                writer.write(_error_frame(0, e))
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+
+async def authenticate_vehicle(vehicle, FID_j, B_j, address):
+    # Runs one handshake from the vehicle side and returns the session key
+    reader, writer = await open_connection(address)
+    try:
+        M1 = vehicle.generate_m1(FID_j, B_j)
+        writer.write(encode_frame(MSG_M1, 1, encode_message(MSG_M1, M1)))
+        await writer.drain()
+        frame = await read_frame(reader)
+        if frame is None:
+            raise ConnectionError("Connection to fog node closed.")
+        msg_type, _, payload = frame
+        if msg_type != MSG_M4:
+            raise ValueError(payload.decode('utf-8', 'replace'))
+        return vehicle.establish_session_key(*decode_message(MSG_M4, payload), FID_j)
+    finally:
+        writer.close()
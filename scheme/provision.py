@@ -0,0 +1,153 @@
+import argparse
+import collections
+import csv
+import json
+import os
+import sys
+from pathlib import Path
+
+from .codec import encode_point
+from .common import h, xor_bytes, pad_to_length, random_nonce
+from .cs import CloudServer
+from .storage import MemoryStore, SQLiteStore
+
+
+# Byte length of every identity field the CLI accepts
+FIELD_LENGTHS = {'VID_i': 8, 'VPW_i': 8, 'FID_j': 8}
+
+
+def _read_rows(path):
+    # Yields (line number, row dict) from a CSV (with header) or NDJSON file
+    with open(path, 'r', newline='') as f:
+        if Path(path).suffix.lower() == '.csv':
+            rows = csv.DictReader(f)
+            for row in rows:
+                yield rows.line_num, row
+        else:
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        row = None  # Not JSON
+                    yield line_no, row
+
+
+def read_identities(path, fields):
+    # Streams rows of hex-encoded fields from a CSV (with header) or NDJSON file
+    for line_no, row in _read_rows(path):
+        if row is None:
+            raise ValueError(f"{path}: line {line_no} is not valid JSON")
+        yield tuple(bytes.fromhex(row[name]) for name in fields)
+
+
+def check_identities(path, fields):
+    # One message per bad row, e.g. "line 4: VID_i must be 8 bytes, got 7"
+    errors = []
+    for line_no, row in _read_rows(path):
+        if row is None:
+            errors.append(f"line {line_no}: not valid JSON")
+            continue
+        for name in fields:
+            try:
+                value = bytes.fromhex(row[name])
+            except (KeyError, TypeError, ValueError):
+                errors.append(f"line {line_no}: {name} is missing or not hex")
+                continue
+            if len(value) != FIELD_LENGTHS[name]:
+                errors.append(f"line {line_no}: {name} must be {FIELD_LENGTHS[name]} bytes, got {len(value)}")
+    return errors
+
+
+def provision_vehicles(cs, identities, workers=None):
+    # identities yields (VID_i, VPW_i); yields one smart card dict per vehicle
+    pending = collections.deque()
+
+    def registration_requests():
+        for VID_i, VPW_i in identities:
+            r_1 = random_nonce()
+            PV_i = h(VID_i + VPW_i + r_1)
+            pending.append((VPW_i, r_1, PV_i))
+            yield VID_i, PV_i
+
+    for VID_i, MV_i in cs.register_vehicles_bulk(registration_requests(), workers=workers):
+        VPW_i, r_1, PV_i = pending.popleft()
+        a_i = xor_bytes(MV_i, PV_i)
+        TV_i = h(xor_bytes(VID_i, VPW_i) + a_i)
+        yield {'VID_i': VID_i, 'TV_i': TV_i, 'MV_i': MV_i, 'r_1': r_1}
+
+
+def provision_fog_nodes(cs, FIDs, workers=None):
+    # Yields the storage each fog node keeps (as in FogNode.register)
+    for FID_j, PFD_j, b_j, K_cf, B_j in cs.register_fog_nodes_bulk(FIDs, workers=workers):
+        yield {
+            'FID_j': FID_j,
+            'PFD_j': PFD_j,
+            'Rb_j': xor_bytes(b_j, h(FID_j + K_cf)),
+            'RK_cf': xor_bytes(K_cf, pad_to_length(FID_j, 20)),
+            'B_j': encode_point(B_j),
+        }
+
+
+def load_master_key(path):
+    # Creates a new K_c on first use
+    path = Path(path)
+    if path.exists():
+        return bytes.fromhex(path.read_text().strip())
+    K_c = random_nonce()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(K_c.hex())
+    return K_c
+
+
+def write_ndjson(records, output):
+    
+    count = 0
+    for record in records:
+        output.write(json.dumps({k: v.hex() for k, v in record.items()}) + '\n')
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m scheme.provision',
+        description="Bulk-register vehicles or fog nodes and write their provisioning payloads as NDJSON.",
+    )
+    parser.add_argument('kind', choices=['vehicles', 'fog-nodes'])
+    parser.add_argument('input', help="CSV or NDJSON with hex VID_i,VPW_i (vehicles) or FID_j (fog nodes)")
+    parser.add_argument('output', help="NDJSON output path, or - for stdout")
+    parser.add_argument('--master-key-file', required=True, help="Hex K_c; created if missing")
+    parser.add_argument('--db', help="SQLite registry to write to (in-memory if omitted)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes for key derivation")
+    args = parser.parse_args(argv)
+
+    fields = ('VID_i', 'VPW_i') if args.kind == 'vehicles' else ('FID_j',)
+    # Checked before anything is registered, so a bad row cannot leave a partial batch behind
+    errors = check_identities(args.input, fields)
+    if errors:
+        shown = errors[:20] + ([f"... and {len(errors) - 20} more"] if len(errors) > 20 else [])
+        parser.error(f"{args.input} has {len(errors)} error(s):\n  " + "\n  ".join(shown))
+
+    store = SQLiteStore(args.db) if args.db else MemoryStore()
+    cs = CloudServer(load_master_key(args.master_key_file), store=store)
+
+    if args.kind == 'vehicles':
+        records = provision_vehicles(cs, read_identities(args.input, fields), args.workers)
+    else:
+        FIDs = (FID_j for FID_j, in read_identities(args.input, fields))
+        records = provision_fog_nodes(cs, FIDs, args.workers)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        count = write_ndjson(records, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        store.close()
+    print(f"Provisioned {count} {args.kind}.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+from tinyec.ec import Point
+from .common import h, int_to_bytes, DELTA_T
+
+
+def message_digest(*fields):
+    # Digest of a protocol message; EC points contribute both coordinates
+    return h(b''.join(
+        int_to_bytes(f.x, 32) + int_to_bytes(f.y, 32) if isinstance(f, Point) else bytes(f)
+        for f in fields
+    ))
+
+
+class ReplayCache:
+    # Remembers message digests for as long as their timestamp passes the freshness
+    # check (|now - T| <= window). Digests sit in one-second buckets keyed by the
+    # message timestamp, arranged as a ring of 2 * window + 1 buckets; a bucket is
+    # dropped as soon as its timestamp falls out of the window. When max_entries is
+    # reached the oldest buckets are dropped early: a flood of junk messages can then
+    # reopen replays of the oldest live messages, but cannot lock out new ones.
+    def __init__(self, window=DELTA_T, max_entries=1_000_000):
+        self.window = window
+        self.max_entries = max_entries
+        self.overflows = 0  # Admits that found the cache full
+        self.evicted_early = 0  # Digests dropped before their timestamp expired
+        self._n_buckets = 2 * window + 1
+        self._buckets = [[] for _ in range(self._n_buckets)]
+        self._bucket_times = [None] * self._n_buckets
+        self._seen = {}  # digest -> timestamp
+        self._oldest = None  # Oldest timestamp that may still be live
+
+    def __len__(self):
+        return len(self._seen)
+
+    def __contains__(self, digest):
+        return digest in self._seen
+
+    def metrics(self):
+        
+        return {
+            'entries': len(self._seen),
+            'max_entries': self.max_entries,
+            'overflows': self.overflows,
+            'evicted_early': self.evicted_early,
+        }
+
+    def _evict_bucket(self, slot):
+        
+        for digest in self._buckets[slot]:
+            del self._seen[digest]
+        self._buckets[slot] = []
+        self._bucket_times[slot] = None
+
+    def _advance(self, now):
+        
+        horizon = now - self.window
+        if self._oldest is None:
+            self._oldest = horizon
+            return
+        if horizon - self._oldest >= self._n_buckets:
+            for slot in range(self._n_buckets):
+                if self._bucket_times[slot] is not None:
+                    self._evict_bucket(slot)
+            self._oldest = horizon
+            return
+        while self._oldest < horizon:
+            slot = self._oldest % self._n_buckets
+            if self._bucket_times[slot] == self._oldest:
+                self._evict_bucket(slot)
+            self._oldest += 1
+
+    def _evict_oldest(self):
+        # Drops the oldest live buckets until there is room for one more digest
+        self.overflows += 1
+        for t in range(self._oldest, self._oldest + self._n_buckets):
+            slot = t % self._n_buckets
+            if self._bucket_times[slot] == t:
+                self.evicted_early += len(self._buckets[slot])
+                self._evict_bucket(slot)
+                if len(self._seen) < self.max_entries:
+                    return
+
+    def admit(self, digest, timestamp, now):
+        # Call after the freshness check. Raises ValueError for a replayed digest.
+        self._advance(now)
+        if digest in self._seen:
+            raise ValueError("Replay detected. Aborting.")
+        if len(self._seen) >= self.max_entries:
+            self._evict_oldest()
+        slot = timestamp % self._n_buckets
+        if self._bucket_times[slot] != timestamp:
+            if self._bucket_times[slot] is not None:
+                self._evict_bucket(slot)
+            self._bucket_times[slot] = timestamp
+        self._buckets[slot].append(digest)
+        self._seen[digest] = timestamp
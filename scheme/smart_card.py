@@ -0,0 +1,68 @@
+import mmap
+
+# Fixed layout: TV_i || MV_i || r_1, 20 bytes each
+FIELD_SIZE = 20
+SMART_CARD_LAYOUT = ('TV_i', 'MV_i', 'r_1')
+SMART_CARD_OFFSETS = {name: i * FIELD_SIZE for i, name in enumerate(SMART_CARD_LAYOUT)}
+SMART_CARD_SIZE = FIELD_SIZE * len(SMART_CARD_LAYOUT)
+
+
+class SmartCard:
+    # Vehicle smart card backed by any buffer (bytes, bytearray, mmap). Fields are
+    # read through memoryview slices, so loading a card copies nothing. Indexing
+    # returns bytes, as the dict-based card did.
+    __slots__ = ('_view',)
+
+    def __init__(self, buffer, offset=0):
+        view = memoryview(buffer)[offset:offset + SMART_CARD_SIZE]
+        if len(view) != SMART_CARD_SIZE:
+            raise ValueError("Smart card: buffer too short. Aborting.")
+        self._view = view
+
+    @classmethod
+    def issue(cls, TV_i, MV_i, r_1):
+        
+        fields = (TV_i, MV_i, r_1)
+        if any(len(value) != FIELD_SIZE for value in fields):
+            raise ValueError("Smart card: fields must be 20 bytes. Aborting.")
+        return cls(b''.join(fields))
+
+    @classmethod
+    def load(cls, path, offset=0):
+        # Maps the file read-only; the mapping stays open while the card is in use
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), offset)
+
+    @classmethod
+    def load_all(cls, path):
+        # Cards stored back to back, e.g. a fleet written with dump_all
+        with open(path, 'rb') as f:
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return [cls(view, offset) for offset in range(0, len(view) - SMART_CARD_SIZE + 1, SMART_CARD_SIZE)]
+
+    @staticmethod
+    def dump_all(cards, path):
+        
+        with open(path, 'wb') as f:
+            for card in cards:
+                f.write(card._view)
+
+    def field(self, name):
+        
+        offset = SMART_CARD_OFFSETS[name]
+        return self._view[offset:offset + FIELD_SIZE]
+
+    def __getitem__(self, name):
+        return bytes(self.field(name))
+
+    def __contains__(self, name):
+        return name in SMART_CARD_OFFSETS
+
+    def to_bytes(self):
+        
+        return bytes(self._view)
+
+    def save(self, path):
+        
+        with open(path, 'wb') as f:
+            f.write(self._view)
@@ -0,0 +1,145 @@
+import sqlite3
+
+
+class VehicleRecord:
+    __slots__ = ('VID_i', 'PV_i', 'a_i', 'session_key')
+
+    def __init__(self, VID_i, PV_i, a_i, session_key=None):
+        self.VID_i = VID_i
+        self.PV_i = PV_i
+        self.a_i = a_i
+        self.session_key = session_key
+
+
+class FogNodeRecord:
+    __slots__ = ('FID_j', 'PFD_j', 'b_j', 'K_cf')
+
+    def __init__(self, FID_j, PFD_j, b_j, K_cf):
+        self.FID_j = FID_j
+        self.PFD_j = PFD_j
+        self.b_j = b_j
+        self.K_cf = K_cf
+
+
+class MemoryStore:
+    # Registry held in process memory, lost on restart
+    def __init__(self):
+        self._vehicles = {}
+        self._fog_nodes = {}
+
+    def get_vehicle(self, VID_i):
+        
+        return self._vehicles.get(VID_i)
+
+    def put_vehicle(self, record):
+        
+        self._vehicles[record.VID_i] = record
+
+    def set_session_key(self, VID_i, session_key):
+        # Returns False when the vehicle is not registered
+        record = self._vehicles.get(VID_i)
+        if record is None:
+            return False
+        record.session_key = session_key
+        return True
+
+    def get_fog_node(self, FID_j):
+        
+        return self._fog_nodes.get(FID_j)
+
+    def put_fog_node(self, record):
+        
+        self._fog_nodes[record.FID_j] = record
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    # Persistent registry keyed by VID_i / FID_j. Records are read on demand, so
+    # opening an existing database does not load it. Writes, session keys included,
+    # are buffered and committed in batches of batch_size; reads see buffered writes.
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending_vehicles = {}
+        self._pending_fog_nodes = {}
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vehicles ("
+            "vid BLOB PRIMARY KEY, pv BLOB NOT NULL, a BLOB NOT NULL, session_key BLOB"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fog_nodes ("
+            "fid BLOB PRIMARY KEY, pfd BLOB NOT NULL, b BLOB NOT NULL, k_cf BLOB NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get_vehicle(self, VID_i):
+        
+        record = self._pending_vehicles.get(VID_i)
+        if record is not None:
+            return record
+        row = self._conn.execute(
+            "SELECT vid, pv, a, session_key FROM vehicles WHERE vid = ?", (VID_i,)
+        ).fetchone()
+        return VehicleRecord(*row) if row else None
+
+    def put_vehicle(self, record):
+        
+        self._pending_vehicles[record.VID_i] = record
+        if len(self._pending_vehicles) >= self.batch_size:
+            self.flush()
+
+    def set_session_key(self, VID_i, session_key):
+        # The updated record joins the pending vehicle writes instead of committing per M2
+        record = self.get_vehicle(VID_i)
+        if record is None:
+            return False
+        record.session_key = session_key
+        self.put_vehicle(record)
+        return True
+
+    def get_fog_node(self, FID_j):
+        
+        record = self._pending_fog_nodes.get(FID_j)
+        if record is not None:
+            return record
+        row = self._conn.execute(
+            "SELECT fid, pfd, b, k_cf FROM fog_nodes WHERE fid = ?", (FID_j,)
+        ).fetchone()
+        return FogNodeRecord(*row) if row else None
+
+    def put_fog_node(self, record):
+        
+        self._pending_fog_nodes[record.FID_j] = record
+        if len(self._pending_fog_nodes) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        
+        if self._pending_vehicles:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vehicles (vid, pv, a, session_key) VALUES (?, ?, ?, ?)",
+                [(r.VID_i, r.PV_i, r.a_i, r.session_key) for r in self._pending_vehicles.values()],
+            )
+        if self._pending_fog_nodes:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fog_nodes (fid, pfd, b, k_cf) VALUES (?, ?, ?, ?)",
+                [(r.FID_j, r.PFD_j, r.b_j, r.K_cf) for r in self._pending_fog_nodes.values()],
+            )
+        self._conn.commit()
+        self._pending_vehicles.clear()
+        self._pending_fog_nodes.clear()
+
+    def close(self):
+        
+        self.flush()
+        self._conn.close()
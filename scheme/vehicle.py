@@ -1,9 +1,42 @@
-import time
 import secrets
-from .common import h, G, CURVE, ORDER, xor_bytes, int_to_bytes, bytes_to_int, random_nonce, DELTA_T, pad_to_length
+from .common import h, G, CURVE, ORDER, mul_G, ecdh_x, xor_bytes, int_to_bytes, bytes_to_int, random_nonce, DELTA_T, RESUMPTION_LIFETIME, pad_to_length, derive_resumption_ticket, derive_handover_ticket, current_time, instrumented_phase, count_operation
+from .smart_card import SmartCard
+
+
+class VehicleSession:
+    # Per-handshake state, from M1 (or a resumption request) to the session key
+    __slots__ = ('r_3', 'r_3_prime', 'Q_x', 'RID_i', 'n_v')
+
+    def __init__(self, r_3=None, r_3_prime=None, Q_x=None, RID_i=None, n_v=None):
+        self.r_3 = r_3
+        self.r_3_prime = r_3_prime
+        self.Q_x = Q_x
+        self.RID_i = RID_i
+        self.n_v = n_v
+
+
+def _session_field(name):
+
+    def set_field(self, value):
+        if self.session is None:
+            self.session = VehicleSession()
+        setattr(self.session, name, value)
+
+    return property(lambda self: getattr(self.session, name) if self.session else None, set_field)
+
 
 class Vehicle:
-    def __init__(self, VID_i, VPW_i):
+    ENTITY = 'vehicle'
+
+    __slots__ = ('VID_i', 'VPW_i', '_r_1', 'smart_card', 'session_key', 'session', 'resumption_lifetime', 'ticket')
+
+    r_3 = _session_field('r_3')
+    r_3_prime = _session_field('r_3_prime')
+    Q_x = _session_field('Q_x')
+    RID_i = _session_field('RID_i')
+    n_v = _session_field('n_v')
+
+    def __init__(self, VID_i, VPW_i, resumption_lifetime=RESUMPTION_LIFETIME, smart_card=None):
         # VID and VPW must be 8 bytes (64 bits) as per scheme specification
         if isinstance(VID_i, str):
             VID_i = VID_i.encode()[:8].ljust(8, b'\x00')
@@ -11,14 +44,19 @@ class Vehicle:
             VPW_i = VPW_i.encode()[:8].ljust(8, b'\x00')
         self.VID_i = VID_i
         self.VPW_i = VPW_i
-        self.r_1 = random_nonce()
-        self.smart_card = {}
+        # r_1 lives on the smart card once it is issued
+        self._r_1 = None if smart_card is not None else random_nonce()
+        self.smart_card = smart_card  # SmartCard, or None before registration
         self.session_key = None
-        self.r_3 = None
-        self.r_3_prime = None
-        self.Q_i = None
-        self.RID_i = None
+        self.session = None
+        self.resumption_lifetime = resumption_lifetime
+        self.ticket = None  # (FID_j, TID, RMS, expires_at) from the last session
+
+    @property
+    def r_1(self):
+        return self.smart_card['r_1'] if self.smart_card is not None else self._r_1
 
+    @instrumented_phase('registration')
     def register(self, cs):
         
         PV_i = h(self.VID_i + self.VPW_i + self.r_1)
@@ -27,49 +65,98 @@ class Vehicle:
         a_i = xor_bytes(MV_i, PV_i)
         TV_i = h(xor_bytes(self.VID_i, self.VPW_i) + a_i)
         
-        self.smart_card['TV_i'] = TV_i
-        self.smart_card['MV_i'] = MV_i
-        self.smart_card['r_1'] = self.r_1
+        self.smart_card = SmartCard.issue(TV_i, MV_i, self.r_1)
+        self._r_1 = None
 
+    @instrumented_phase('login')
     def login_and_verify(self, VID_i_star, VPW_i_star):
         
-        if 'r_1' not in self.smart_card or 'MV_i' not in self.smart_card:
+        if self.smart_card is None:
             raise ValueError("Vehicle not registered.")
 
-        PV_i = h(VID_i_star + VPW_i_star + self.smart_card['r_1'])
-        a_i = xor_bytes(self.smart_card['MV_i'], PV_i)
+        card = self.smart_card
+        PV_i = h(VID_i_star + VPW_i_star + card.field('r_1'))
+        a_i = xor_bytes(card.field('MV_i'), PV_i)
         TV_i_star = h(xor_bytes(VID_i_star, VPW_i_star) + a_i)
 
-        if TV_i_star != self.smart_card['TV_i']:
+        if TV_i_star != card.field('TV_i'):
             raise ValueError("Login failed: TV_i does not match.")
         
         return a_i
 
+    @instrumented_phase('M1')
     def generate_m1(self, FID_j, B_j):
         
+        self.session = VehicleSession()
+        count_operation('nonce')
         self.r_3 = secrets.randbelow(ORDER)
         self.r_3_prime = random_nonce()  # 20 bytes
-        T_1 = int_to_bytes(int(time.time()), 4)  # 32 bits = 4 bytes
+        T_1 = int_to_bytes(int(current_time()), 4)  # 32 bits = 4 bytes
 
-        P_i = self.r_3 * G
-        self.Q_i = self.r_3 * B_j
+        P_i = mul_G(self.r_3)
+        self.Q_x = ecdh_x(self.r_3, B_j)  # x-coordinate of Q_i = r_3 * B_j
         
         # As per flaw, V_i needs FID_j
-        self.RID_i = xor_bytes(self.VID_i, xor_bytes(int_to_bytes(self.Q_i.x)[:8], pad_to_length(FID_j, 8)))
-        F_i = xor_bytes(self.r_3_prime, int_to_bytes(self.Q_i.x)[:20])  # Truncate Q_i.x to 20 bytes
+        self.RID_i = xor_bytes(self.VID_i, xor_bytes(self.Q_x[:8], pad_to_length(FID_j, 8)))
+        F_i = xor_bytes(self.r_3_prime, self.Q_x[:20])  # Truncate Q_i.x to 20 bytes
 
         return self.RID_i, P_i, F_i, T_1
 
+    @instrumented_phase('SK')
     def establish_session_key(self, N_i, J_i, T_4, FID_j):
         
-        if abs(int(time.time()) - bytes_to_int(T_4)) > DELTA_T:
+        if abs(int(current_time()) - bytes_to_int(T_4)) > DELTA_T:
             raise ValueError("V_i: T4 is not fresh. Aborting.")
         
-        J_i_star = h(self.RID_i + xor_bytes(self.r_3_prime, int_to_bytes(self.Q_i.x)[:20]))  # Truncate Q_i.x to 20 bytes
+        J_i_star = h(self.RID_i + xor_bytes(self.r_3_prime, self.Q_x[:20]))  # Truncate Q_i.x to 20 bytes
         if J_i_star != J_i:
             raise ValueError("V_i: J_i* verification failed. Aborting.")
 
         # As per flaw, V_i needs FID_j
         VID_i_xor_FID_j = xor_bytes(self.VID_i, pad_to_length(FID_j, 8))
-        self.session_key = xor_bytes(N_i, h(xor_bytes(pad_to_length(FID_j, 20), int_to_bytes(self.Q_i.x)[:20]) + VID_i_xor_FID_j))  # Truncate Q_i.x to 20 bytes
+        self.session_key = xor_bytes(N_i, h(xor_bytes(pad_to_length(FID_j, 20), self.Q_x[:20]) + VID_i_xor_FID_j))  # Truncate Q_i.x to 20 bytes
+        self._issue_ticket(FID_j)
+        return self.session_key
+
+    def _issue_ticket(self, FID_j):
+        
+        TID, RMS = derive_resumption_ticket(self.session_key)
+        self.ticket = (FID_j, TID, RMS, current_time() + self.resumption_lifetime)
+
+    @instrumented_phase('handover')
+    def prepare_handover(self, FID_next):
+        # Switches the ticket to the neighbour FID_next; re-key there with resume_request
+        if self.session_key is None:
+            raise ValueError("V_i: no session to hand over.")
+        TID, RMS = derive_handover_ticket(self.session_key, FID_next)
+        self.ticket = (FID_next, TID, RMS, current_time() + self.resumption_lifetime)
+
+    def has_resumption_ticket(self, FID_j):
+        
+        return self.ticket is not None and self.ticket[0] == FID_j and current_time() < self.ticket[3]
+
+    @instrumented_phase('resumption')
+    def resume_request(self, FID_j):
+        # Hash-only re-keying with the fog node of the previous session
+        if not self.has_resumption_ticket(FID_j):
+            raise ValueError("V_i: no valid resumption ticket for F_j.")
+        _, TID, RMS, _ = self.ticket
+        self.session = VehicleSession(n_v=random_nonce())  # 20 bytes
+        T_r = int_to_bytes(int(current_time()), 4)  # 32 bits = 4 bytes
+        A_v = h(RMS + TID + self.n_v + T_r)
+        return TID, self.n_v, T_r, A_v
+
+    @instrumented_phase('resumption')
+    def complete_resumption(self, n_f, T_f, A_f):
+        
+        if abs(int(current_time()) - bytes_to_int(T_f)) > DELTA_T:
+            raise ValueError("V_i: T_f is not fresh. Aborting.")
+
+        FID_j, _, RMS, _ = self.ticket
+        SK = h(RMS + self.n_v + n_f)
+        if h(SK + n_f + T_f) != A_f:
+            raise ValueError("V_i: A_f verification failed. Aborting.")
+
+        self.session_key = SK
+        self._issue_ticket(FID_j)
         return self.session_key
@@ -1,129 +1,266 @@
+import gc
+import hashlib
+import json
+import os
+import platform
+import sys
 import time
 import secrets
-from typing import Dict
+from importlib import metadata
+from typing import Callable, Dict
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 from tinyec import registry
-import statistics
+
+from scheme import CloudServer, FogNode, Vehicle
+from scheme.common import get_provider, random_nonce, set_provider
+from simulations.pairing import G1, G2, CURVE_ORDER, final_exponentiation, g1_mul, g2_mul, miller_loop, pairing
+from simulations.stats import summarize_samples
+
+
+def _read_first_line(path: str, prefix: str = '') -> str:
+
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(prefix):
+                    return line.split(':', 1)[-1].strip() if prefix else line.strip()
+    except OSError:
+        pass
+    return None
+
+
+def environment_fingerprint() -> Dict[str, object]:
+    # Host and software details stored with benchmark results; 'id' is a short hash of the rest
+    env = {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_model': _read_first_line('/proc/cpuinfo', 'model name') or platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'cpu_affinity': sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None,
+        'cpu_governor': _read_first_line('/sys/devices/system/cpu/cpu0/cpufreq/scaling_governor'),
+        'crypto_provider': get_provider().name,
+        'packages': {},
+    }
+    for package in ('cryptography', 'tinyec'):
+        try:
+            env['packages'][package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            env['packages'][package] = None
+    env['id'] = hashlib.sha256(json.dumps(env, sort_keys=True).encode()).hexdigest()[:16]
+    return env
 
 
 class CryptoBenchmark:
-    def __init__(self, iterations: int = 10, data_size: int = 32):
+    # Each operation gets warmup calls, then `iterations` timed samples. Fast operations
+    # repeat inside a sample until it lasts at least min_sample_ms, and a sample
+    # records the time per call. Outliers are dropped with Tukey's fences before the
+    # statistics in self.stats are computed; the run_all_benchmarks values are their means.
+    def __init__(self, iterations: int = 10, data_size: int = 32, provider: str = None, warmup: int = 3,
+                 min_sample_ms: float = 1.0, confidence: float = 0.95, outlier_k: float = 1.5,
+                 cpu_affinity=None, pairing_iterations: int = 10):
         self.iterations = iterations
+        self.pairing_iterations = pairing_iterations  # Samples for the BN254 pairing operations
         self.data_size = data_size
+        # Scalar multiplications go through the same provider the scheme uses
+        self.provider = set_provider(provider) if provider else get_provider()
+        self.warmup = warmup
+        self.min_sample_ms = min_sample_ms
+        self.confidence = confidence
+        self.outlier_k = outlier_k
+        self.cpu_affinity = cpu_affinity
+        self.stats = {}
+        self.environment = None
         self.curve = registry.get_curve('secp256r1')
         self.G = self.curve.g
         # Get the field order from the curve's field
         self.order = self.curve.field.n
-        
+
+    def _calibrate(self, op: Callable[[], object]) -> int:
+        # Smallest power-of-two loop count that makes one sample last min_sample_ms
+        inner = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(inner):
+                op()
+            if (time.perf_counter() - start) * 1000 >= self.min_sample_ms or inner >= 1 << 20:
+                return inner
+            inner *= 2
+
+    def measure(self, name: str, op: Callable[[], object], iterations: int = None) -> float:
+
+        for _ in range(self.warmup):
+            op()
+        inner = self._calibrate(op)
+        samples = []
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(iterations or self.iterations):
+                start = time.perf_counter()
+                for _ in range(inner):
+                    op()
+                samples.append((time.perf_counter() - start) * 1000 / inner)  # ms per call
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.stats[name] = {**summarize_samples(samples, self.confidence, self.outlier_k), 'inner_loops': inner}
+        return self.stats[name]['mean']
+
     def benchmark_hash(self) -> float:
-        
-        times = []
+
         data = secrets.token_bytes(self.data_size)
-        
-        for _ in range(self.iterations):
-            start = time.perf_counter()
+
+        def op():
             digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
             digest.update(data)
             digest.finalize()
-            end = time.perf_counter()
-            times.append((end - start) * 1000)  # Convert to ms
-        
-        return statistics.mean(times)
-    
+
+        return self.measure('T_h', op)
+
     def benchmark_point_addition(self) -> float:
-        
-        times = []
+
         # Generate two random points
         k1 = secrets.randbelow(self.order)
         k2 = secrets.randbelow(self.order)
         P1 = k1 * self.G
         P2 = k2 * self.G
-        
-        for _ in range(self.iterations):
-            start = time.perf_counter()
-            _ = P1 + P2
-            end = time.perf_counter()
-            times.append((end - start) * 1000)
-        
-        return statistics.mean(times)
-    
+
+        return self.measure('T_pa', lambda: P1 + P2)
+
     def benchmark_symmetric_encryption(self) -> float:
-        
-        times = []
+
         key = secrets.token_bytes(32)  # 256-bit key
         data = secrets.token_bytes(self.data_size)
-        
-        for _ in range(self.iterations):
-            iv = secrets.token_bytes(16)
-            cipher = Cipher(
-                algorithms.AES(key),
-                modes.CBC(iv),
-                backend=default_backend()
-            )
-            
-            start = time.perf_counter()
+        cipher = Cipher(
+            algorithms.AES(key),
+            modes.CBC(secrets.token_bytes(16)),
+            backend=default_backend()
+        )
+        # Pad data to block size
+        padded_data = data + b'\x00' * (16 - len(data) % 16)
+
+        def op():
             encryptor = cipher.encryptor()
-            # Pad data to block size
-            padded_data = data + b'\x00' * (16 - len(data) % 16)
             ct = encryptor.update(padded_data) + encryptor.finalize()
-            
             decryptor = cipher.decryptor()
-            pt = decryptor.update(ct) + decryptor.finalize()
-            end = time.perf_counter()
-            times.append((end - start) * 1000)
-        
-        return statistics.mean(times)
-    
+            decryptor.update(ct) + decryptor.finalize()
+
+        return self.measure('T_ed', op)
+
     def benchmark_scalar_multiplication(self) -> float:
-        
-        times = []
+
         k = secrets.randbelow(self.order)
-        
-        for _ in range(self.iterations):
-            start = time.perf_counter()
-            _ = k * self.G
-            end = time.perf_counter()
-            times.append((end - start) * 1000)
-        
-        return statistics.mean(times)
-    
+        # Variable-base ECDH, as in Q_i = r_3 * B_j and Q_i = b_j * P_i
+        P = self.provider.mul_G(secrets.randbelow(self.order))
+
+        return self.measure('T_sm', lambda: self.provider.ecdh_x(k, P))
+
+    def _pairing_inputs(self):
+        # Random P in G1 and Q in G2 on BN254
+        return g1_mul(secrets.randbelow(CURVE_ORDER), G1), g2_mul(secrets.randbelow(CURVE_ORDER), G2)
+
     def benchmark_bilinear_pairing(self) -> float:
-        times = []
-        k1 = secrets.randbelow(self.order)
-        k2 = secrets.randbelow(self.order)
-        
-        for _ in range(self.iterations):
-            start = time.perf_counter()
-            # Simulate expensive pairing operation
-            P1 = k1 * self.G
-            P2 = k2 * self.G
-            _ = P1 + P2
-            end = time.perf_counter()
-            times.append((end - start) * 1000)
-        
-        return statistics.mean(times)
-    
-    def run_all_benchmarks(self) -> Dict[str, float]:
-        
-        print(f"Running benchmarks with {self.iterations} iterations...")
-        
-        results = {
-            'T_h': self.benchmark_hash(),
-            'T_pa': self.benchmark_point_addition(),
-            'T_ed': self.benchmark_symmetric_encryption(),
-            'T_sm': self.benchmark_scalar_multiplication(),
-            'T_bp': self.benchmark_bilinear_pairing(),
+        # Optimal ate pairing on BN254 (simulations.pairing)
+        P, Q = self._pairing_inputs()
+
+        return self.measure('T_bp', lambda: pairing(Q, P), self.pairing_iterations)
+
+    def benchmark_miller_loop(self) -> float:
+
+        P, Q = self._pairing_inputs()
+
+        return self.measure('T_ml', lambda: miller_loop(Q, P), self.pairing_iterations)
+
+    def benchmark_final_exponentiation(self) -> float:
+
+        P, Q = self._pairing_inputs()
+        f = miller_loop(Q, P)
+
+        return self.measure('T_fe', lambda: final_exponentiation(f), self.pairing_iterations)
+
+    def benchmark_handshake(self) -> float:
+        # End-to-end M1-M4 handshake with all three entities in-process
+        cs = CloudServer(random_nonce())
+        fog = FogNode(secrets.token_bytes(8))
+        fog.register(cs)
+        vehicle = Vehicle(secrets.token_bytes(8), secrets.token_bytes(8))
+        vehicle.register(cs)
+
+        def op():
+            M1 = vehicle.generate_m1(fog.FID_j, fog.storage['B_j'])
+            M3 = cs.handle_m2(*fog.generate_m2(*M1), fog.FID_j)
+            vehicle.establish_session_key(*fog.generate_m4(*M3), fog.FID_j)
+
+        return self.measure('T_hs', op)
+
+    def _pin_cpus(self):
+        # Returns the previous affinity so it can be restored, or None if nothing changed
+        if not self.cpu_affinity:
+            return None
+        if not hasattr(os, 'sched_setaffinity'):
+            print("CPU pinning is not supported on this platform; running unpinned.")
+            return None
+        previous = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, set(self.cpu_affinity))
+        return previous
+
+    def run_all_benchmarks(self, only=None) -> Dict[str, float]:
+        # only restricts the run to the named results, e.g. ('T_h', 'T_sm')
+        benchmarks = {
+            'T_h': self.benchmark_hash,
+            'T_pa': self.benchmark_point_addition,
+            'T_ed': self.benchmark_symmetric_encryption,
+            'T_sm': self.benchmark_scalar_multiplication,
+            'T_bp': self.benchmark_bilinear_pairing,
+            'T_ml': self.benchmark_miller_loop,
+            'T_fe': self.benchmark_final_exponentiation,
+            'T_hs': self.benchmark_handshake,
         }
-        
+        if only is not None:
+            benchmarks = {name: benchmarks[name] for name in only}
+
+        print(f"Running benchmarks with {self.iterations} samples, {self.warmup} warmup calls "
+              f"(provider: {self.provider.name})...")
+
+        previous_affinity = self._pin_cpus()
+        try:
+            self.environment = environment_fingerprint()
+            results = {name: run() for name, run in benchmarks.items()}
+        finally:
+            if previous_affinity is not None:
+                os.sched_setaffinity(0, previous_affinity)
+
         return results
 
 
-def run_benchmarks(cfg) -> Dict[str, float]:
-    
-    benchmark = CryptoBenchmark(
-        iterations=cfg.benchmark.iterations,
-        data_size=cfg.benchmark.data_size
+def print_benchmark_stats(stats: Dict[str, Dict[str, float]], confidence: float = 0.95):
+
+    print(f"\n  {'ms':<6} {'mean':>10} {'p50':>10} {'p90':>10} {'p99':>10} {'stddev':>10}  {confidence:.0%} CI")
+    for op, s in stats.items():
+        print(f"  {op:<6} {s['mean']:10.6f} {s['p50']:10.6f} {s['p90']:10.6f} {s['p99']:10.6f} {s['stddev']:10.6f}"
+              f"  [{s['ci_low']:.6f}, {s['ci_high']:.6f}]  n={s['samples']} (-{s['outliers']})")
+
+
+def create_benchmark(cfg) -> CryptoBenchmark:
+
+    bench_cfg = cfg.benchmark
+    return CryptoBenchmark(
+        iterations=bench_cfg.iterations,
+        data_size=bench_cfg.data_size,
+        provider=bench_cfg.get('provider'),
+        warmup=bench_cfg.get('warmup', 3),
+        min_sample_ms=bench_cfg.get('min_sample_ms', 1.0),
+        confidence=bench_cfg.get('confidence', 0.95),
+        outlier_k=bench_cfg.get('outlier_k', 1.5),
+        cpu_affinity=bench_cfg.get('cpu_affinity'),
+        pairing_iterations=bench_cfg.get('pairing_iterations', 10),
     )
-    return benchmark.run_all_benchmarks()
+
+
+def run_benchmarks(cfg, only=None) -> Dict[str, float]:
+
+    return create_benchmark(cfg).run_all_benchmarks(only)
@@ -1,13 +1,53 @@
+import secrets
 from typing import Dict, List
 
+from scheme import CloudServer, FogNode, Vehicle
+from scheme.codec import MSG_M1, MSG_M2, MSG_M3, MSG_M4, encode_message
+from scheme.common import random_nonce
+
 
 def calculate_message_size(message_components: List[str], bit_sizes: Dict[str, int]) -> int:
     return sum(bit_sizes[component] for component in message_components)
 
 
+def measure_message_sizes() -> Dict[str, int]:
+    # Runs one real handshake and encodes every message with scheme.codec.
+    # M2 includes FID_j, which the codec carries for the CS.
+    cs = CloudServer(random_nonce())
+    FID_j = secrets.token_bytes(8)
+    fog = FogNode(FID_j)
+    fog.register(cs)
+    VID_i, VPW_i = secrets.token_bytes(8), secrets.token_bytes(8)
+    vehicle = Vehicle(VID_i, VPW_i)
+    vehicle.register(cs)
+    vehicle.login_and_verify(VID_i, VPW_i)
+
+    M1 = vehicle.generate_m1(FID_j, fog.storage['B_j'])
+    M2 = fog.generate_m2(*M1)
+    M3 = cs.handle_m2(*M2, FID_j)
+    M4 = fog.generate_m4(*M3)
+
+    return {
+        'M1': len(encode_message(MSG_M1, M1)) * 8,
+        'M2': len(encode_message(MSG_M2, (*M2, FID_j))) * 8,
+        'M3': len(encode_message(MSG_M3, M3)) * 8,
+        'M4': len(encode_message(MSG_M4, M4)) * 8,
+    }
+
+
 def calculate_communication_cost(cfg) -> Dict[str, int]:
     comm_cfg = cfg.evaluation.communication_cost
     
+    if comm_cfg.get('mode', 'analytic') == 'measured':
+        sizes = measure_message_sizes()
+        total_size = sum(sizes.values())
+        return {
+            **sizes,
+            'total_bits': total_size,
+            'total_bytes': total_size // 8,
+            'total_kb': total_size / (8 * 1024),
+        }
+    
     # Extract bit sizes
     bit_sizes = {
         'hash_output': comm_cfg.hash_output,
@@ -44,12 +84,15 @@ def print_communication_cost(results: Dict[str, int], cfg):
     
     comm_cfg = cfg.evaluation.communication_cost
     
-    print(f"\nData Type Sizes:")
-    print(f"  Hash Output:             {comm_cfg.hash_output} bits")
-    print(f"  Random/Non-random:       {comm_cfg.random_number} bits")
-    print(f"  EC Point:                {comm_cfg.ec_point} bits")
-    print(f"  Identifier:              {comm_cfg.identifier} bits")
-    print(f"  Timestamp:               {comm_cfg.timestamp} bits")
+    if comm_cfg.get('mode', 'analytic') == 'measured':
+        print(f"\nMeasured from messages encoded by scheme.codec (compressed P_i)")
+    else:
+        print(f"\nData Type Sizes:")
+        print(f"  Hash Output:             {comm_cfg.hash_output} bits")
+        print(f"  Random/Non-random:       {comm_cfg.random_number} bits")
+        print(f"  EC Point:                {comm_cfg.ec_point} bits")
+        print(f"  Identifier:              {comm_cfg.identifier} bits")
+        print(f"  Timestamp:               {comm_cfg.timestamp} bits")
     
     print(f"\nMessage Sizes:")
     print(f"  M1 (V_i -> F_j):          {results['M1']} bits ({results['M1']//8} bytes)")
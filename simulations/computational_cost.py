@@ -1,11 +1,67 @@
+import secrets
+from types import SimpleNamespace
 from typing import Dict
 
+from scheme import CloudServer, FogNode, Vehicle
+from scheme.common import count_operations, random_nonce
+
+ENTITIES = ('vehicle', 'fog_node', 'cloud_server')
+# Phases of the login and authentication part of the protocol
+AUTHENTICATION_PHASES = ('login', 'M1', 'M2', 'M3', 'M4', 'SK')
+
+
+def measure_operation_counts() -> Dict[str, Dict[str, Dict[str, int]]]:
+    # Runs one login and handshake with scheme.common counting operations;
+    # returns {entity: {phase: {operation: count}}}
+    cs = CloudServer(random_nonce())
+    fog = FogNode(secrets.token_bytes(8))
+    fog.register(cs)
+    vehicle = Vehicle(secrets.token_bytes(8), secrets.token_bytes(8))
+    vehicle.register(cs)
+
+    with count_operations() as counter:
+        vehicle.login_and_verify(vehicle.VID_i, vehicle.VPW_i)
+        M1 = vehicle.generate_m1(fog.FID_j, fog.storage['B_j'])
+        M2 = fog.generate_m2(*M1)
+        M3 = cs.handle_m2(*M2, fog.FID_j)
+        M4 = fog.generate_m4(*M3)
+        vehicle.establish_session_key(*M4, fog.FID_j)
+
+    counts = counter.as_dict()
+    return {entity: {phase: ops for phase, ops in counts.get(entity, {}).items() if phase in AUTHENTICATION_PHASES}
+            for entity in ENTITIES}
+
+
+def measure_phase_operation_counts() -> Dict[str, Dict[str, int]]:
+    # measure_operation_counts merged over entities: {phase: {operation: count}}
+    phases = {}
+    for entity_phases in measure_operation_counts().values():
+        for phase, ops in entity_phases.items():
+            merged = phases.setdefault(phase, {})
+            for operation, n in ops.items():
+                merged[operation] = merged.get(operation, 0) + n
+    return phases
+
+
+def _entity_counts(phase_counts: Dict[str, Dict[str, int]]):
+
+    totals = {}
+    for ops in phase_counts.values():
+        for operation, n in ops.items():
+            totals[operation] = totals.get(operation, 0) + n
+    return SimpleNamespace(hash=totals.get('hash', 0), scalar_mult=totals.get('scalar_mult', 0))
+
 
 def calculate_computational_cost(benchmark_results: Dict[str, float], cfg) -> Dict[str, float]:
     T_h = benchmark_results['T_h']
     T_sm = benchmark_results['T_sm']
     
     comp_cfg = cfg.evaluation.computational_cost
+    operation_counts = None
+    if comp_cfg.get('mode', 'analytic') == 'measured':
+        # Counts from a real handshake replace the configured ones
+        operation_counts = measure_operation_counts()
+        comp_cfg = SimpleNamespace(**{entity: _entity_counts(operation_counts[entity]) for entity in ENTITIES})
     
     # Calculate cost for each entity
     vehicle_cost = (
@@ -25,7 +81,7 @@ def calculate_computational_cost(benchmark_results: Dict[str, float], cfg) -> Di
     
     total_cost = vehicle_cost + fog_node_cost + cloud_server_cost
     
-    return {
+    results = {
         'vehicle': vehicle_cost,
         'fog_node': fog_node_cost,
         'cloud_server': cloud_server_cost,
@@ -45,6 +101,9 @@ def calculate_computational_cost(benchmark_results: Dict[str, float], cfg) -> Di
             )
         }
     }
+    if operation_counts is not None:
+        results['operation_counts'] = operation_counts
+    return results
 
 
 def print_computational_cost(results: Dict[str, float]):
@@ -60,6 +119,14 @@ def print_computational_cost(results: Dict[str, float]):
     print(f"\nOperation Counts:")
     print(f"  Total Hash operations:   {results['breakdown']['total_hash_ops']}")
     print(f"  Total Scalar Mult:       {results['breakdown']['total_scalar_mult_ops']}")
+    if 'operation_counts' in results:
+        print(f"\nMeasured Operations (per phase):")
+        for entity, phases in results['operation_counts'].items():
+            for phase, ops in phases.items():
+                summary = ', '.join(f"{operation}={n}" for operation, n in sorted(ops.items()))
+                print(f"  {entity + ' ' + phase + ':':<24} {summary}")
+        print(f"  point_add is counted inside scalar multiplications (priced in T_sm, not T_pa);")
+        print(f"  the scheme adds no points itself, and OpenSSL (native provider) calls report none.")
     
     print(f"\nEntity Costs:")
     print(f"  Vehicle (V_i):           {results['vehicle']:.4f} ms")
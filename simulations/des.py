@@ -0,0 +1,373 @@
+import itertools
+import json
+import random
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict
+
+import hydra
+from omegaconf import DictConfig, OmegaConf
+
+from scheme.common import DELTA_T, current_time, get_provider, set_clock, set_provider
+from simulations.benchmarks import run_benchmarks
+from simulations.communication_cost import calculate_communication_cost
+from simulations.computational_cost import measure_phase_operation_counts
+from simulations.events import EventScheduler, Processor
+from simulations.fleet import arrival_rate, build_fleet
+from simulations.loopback import summarize_latencies
+
+
+class Link:
+    # One direction of a link: messages are serialized at bandwidth_kbps (0 for
+    # unlimited), then spend latency_ms in flight; each is dropped with probability loss
+    __slots__ = ('scheduler', 'latency', 'bandwidth', 'loss', 'rng', 'free_at', 'busy', 'sent', 'dropped')
+
+    def __init__(self, scheduler, latency_ms, bandwidth_kbps, loss, rng):
+        self.scheduler = scheduler
+        self.latency = latency_ms / 1000
+        self.bandwidth = bandwidth_kbps * 1000
+        self.loss = loss
+        self.rng = rng
+        self.free_at = 0.0
+        self.busy = 0.0
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, bits, callback, *args):
+
+        self.sent += 1
+        start = max(self.scheduler.now, self.free_at)
+        transmit = bits / self.bandwidth if self.bandwidth else 0.0
+        self.free_at = start + transmit
+        self.busy += transmit
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return False
+        self.scheduler.at(self.free_at + self.latency, callback, *args)
+        return True
+
+
+class Handshake:
+    __slots__ = ('id', 'vehicle', 'fog', 'arrival', 'attempt', 'done', 'session')
+
+    def __init__(self, id, vehicle, fog, arrival):
+        self.id = id
+        self.vehicle = vehicle
+        self.fog = fog
+        self.arrival = arrival
+        self.attempt = 0
+        self.done = False
+        self.session = None  # FogSession while the fog node waits for M3
+
+
+class NetworkSimulation:
+    # M1-M4 over modelled V2I and fog-to-cloud links. Each fog node and the CS is a
+    # FIFO processor whose phase costs come from the benchmarked T_h and T_sm. With
+    # execute=True the real scheme code runs at every step under the simulated clock,
+    # so its own freshness checks apply; otherwise timestamps are checked here.
+    def __init__(self, n_vehicles, n_fog_nodes, arrival_cfg, phase_costs, message_bits, v2i, f2c,
+                 retry_timeout_ms=1000.0, max_retries=2, execute=True, trace_limit=0, seed=0):
+        self.rng = random.Random(seed)
+        self.scheduler = EventScheduler()
+        self.arrival_cfg = arrival_cfg
+        self.phase_costs = phase_costs  # phase -> seconds
+        self.message_bits = message_bits
+        self.retry_timeout = retry_timeout_ms / 1000
+        self.max_retries = max_retries
+        self.execute = execute
+        self.trace_limit = trace_limit
+        self.trace = []
+
+        self.n_vehicles = n_vehicles
+        self.n_fog_nodes = n_fog_nodes
+        self.cs = self.fog_nodes = self.vehicles = None
+        if execute:
+            self.cs, self.fog_nodes, self.vehicles = build_fleet(n_vehicles, n_fog_nodes)
+
+        def links(cfg):
+            return [Link(self.scheduler, cfg.latency_ms, cfg.bandwidth_kbps, cfg.loss, self.rng)
+                    for _ in range(n_fog_nodes)]
+
+        self.uplink, self.downlink = links(v2i), links(v2i)
+        self.f2c_up, self.f2c_down = links(f2c), links(f2c)
+        self.fog_cpu = [Processor(self.scheduler) for _ in range(n_fog_nodes)]
+        self.cs_cpu = Processor(self.scheduler)
+
+        self.duration_s = None
+        self._ids = itertools.count()
+        self.busy_vehicles = {}  # vehicle index -> deque of queued arrival times
+        self.latencies = []
+        self.attempts = []
+        self.abandoned = 0
+        self.rejections = {}
+
+    def _record(self, hs, entity, event):
+
+        if len(self.trace) < self.trace_limit:
+            self.trace.append({'t_ms': self.scheduler.now * 1000, 'handshake': hs.id, 'entity': entity, 'event': event})
+
+    def _timestamp(self):
+
+        return int(current_time())
+
+    def _stale(self, hs, timestamp, entity):
+        # Freshness check used when the scheme code is not executed
+        if abs(int(current_time()) - timestamp) > DELTA_T:
+            self._reject(hs, entity, f"{entity}: timestamp is not fresh. Aborting.")
+            return True
+        return False
+
+    def _reject(self, hs, entity, reason):
+        # No abort message is sent; the vehicle notices through its retry timer
+        self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        self._record(hs, entity, 'rejected')
+
+    def _next_arrival(self):
+        # Arrivals stop at duration_s; handshakes in flight then run to completion
+        t = self.scheduler.now + self.rng.expovariate(arrival_rate(self.arrival_cfg, self.scheduler.now))
+        if t <= self.duration_s:
+            self.scheduler.at(t, self._arrive)
+
+    def _arrive(self):
+
+        self._next_arrival()
+        index = self.rng.randrange(self.n_vehicles)
+        if index in self.busy_vehicles:
+            self.busy_vehicles[index].append(self.scheduler.now)
+            return
+        self.busy_vehicles[index] = deque()
+        self._start(Handshake(next(self._ids), index, index % self.n_fog_nodes, self.scheduler.now))
+
+    def _start(self, hs):
+
+        self._record(hs, 'vehicle', 'start')
+        self.scheduler.schedule(self.phase_costs['M1'], self._m1_ready, hs, hs.attempt)
+
+    def _finish(self, hs):
+
+        hs.done = True
+        self.attempts.append(hs.attempt + 1)
+        queued = self.busy_vehicles[hs.vehicle]
+        if queued:
+            self._start(Handshake(next(self._ids), hs.vehicle, hs.fog, queued.popleft()))
+        else:
+            del self.busy_vehicles[hs.vehicle]
+
+    def _timeout(self, hs, attempt):
+
+        if hs.done or attempt != hs.attempt:
+            return
+        if hs.attempt < self.max_retries:
+            hs.attempt += 1
+            self._record(hs, 'vehicle', 'retry')
+            self._start(hs)
+            return
+        self.abandoned += 1
+        self._record(hs, 'vehicle', 'abandoned')
+        self._finish(hs)
+
+    def _live(self, hs, attempt):
+
+        return not hs.done and attempt == hs.attempt
+
+    def _m1_ready(self, hs, attempt):
+
+        M1 = None
+        if self.execute:
+            fog = self.fog_nodes[hs.fog]
+            M1 = self.vehicles[hs.vehicle].generate_m1(fog.FID_j, fog.storage['B_j'])
+        self._record(hs, 'vehicle', 'M1 sent')
+        self.scheduler.schedule(self.retry_timeout, self._timeout, hs, attempt)
+        self.uplink[hs.fog].send(self.message_bits['M1'], self.fog_cpu[hs.fog].submit,
+                                 self.phase_costs['M2'], self._m2_ready, hs, attempt, M1, self._timestamp())
+
+    def _m2_ready(self, hs, attempt, M1, T_1):
+
+        if not self._live(hs, attempt):
+            return
+        M2 = None
+        if self.execute:
+            fog = self.fog_nodes[hs.fog]
+            hs.session, M2 = fog.begin_sessions([M1])[0]
+            if hs.session is None:
+                return self._reject(hs, 'fog_node', str(M2))
+            M2 = M2 + (fog.FID_j,)
+        elif self._stale(hs, T_1, 'F_j'):
+            return
+        self._record(hs, 'fog_node', 'M2 sent')
+        self.f2c_up[hs.fog].send(self.message_bits['M2'], self.cs_cpu.submit,
+                                 self.phase_costs['M3'], self._m3_ready, hs, attempt, M2, self._timestamp())
+
+    def _m3_ready(self, hs, attempt, M2, T_2):
+
+        if not self._live(hs, attempt):
+            return
+        M3 = None
+        if self.execute:
+            try:
+                M3 = self.cs.handle_m2(*M2)
+            except ValueError as e:
+                return self._reject(hs, 'cloud_server', str(e))
+        elif self._stale(hs, T_2, 'CS'):
+            return
+        self._record(hs, 'cloud_server', 'M3 sent')
+        self.f2c_down[hs.fog].send(self.message_bits['M3'], self.fog_cpu[hs.fog].submit,
+                                   self.phase_costs['M4'], self._m4_ready, hs, attempt, M3, self._timestamp())
+
+    def _m4_ready(self, hs, attempt, M3, T_3):
+
+        if not self._live(hs, attempt):
+            return
+        M4 = None
+        if self.execute:
+            M4, = self.fog_nodes[hs.fog].complete_sessions([(hs.session, M3)])
+            if isinstance(M4, ValueError):
+                return self._reject(hs, 'fog_node', str(M4))
+        elif self._stale(hs, T_3, 'F_j'):
+            return
+        self._record(hs, 'fog_node', 'M4 sent')
+        self.downlink[hs.fog].send(self.message_bits['M4'], self.scheduler.schedule,
+                                   self.phase_costs['SK'], self._sk_ready, hs, attempt, M4, self._timestamp())
+
+    def _sk_ready(self, hs, attempt, M4, T_4):
+
+        if not self._live(hs, attempt):
+            return
+        if self.execute:
+            vehicle = self.vehicles[hs.vehicle]
+            try:
+                vehicle.establish_session_key(*M4, self.fog_nodes[hs.fog].FID_j)
+            except ValueError as e:
+                return self._reject(hs, 'vehicle', str(e))
+            if vehicle.session_key != hs.session.session_key:
+                return self._reject(hs, 'vehicle', "V_i: session keys differ. Aborting.")
+        elif self._stale(hs, T_4, 'V_i'):
+            return
+        self._record(hs, 'vehicle', 'session key')
+        self.latencies.append((self.scheduler.now - hs.arrival) * 1000)
+        self._finish(hs)
+
+    def run(self, duration_s):
+
+        self.duration_s = duration_s
+        set_clock(self.scheduler.clock)
+        start = time.perf_counter()
+        try:
+            self._next_arrival()
+            self.scheduler.run()
+        finally:
+            set_clock()
+        return self.results(duration_s, time.perf_counter() - start)
+
+    def results(self, duration_s, wall_s):
+
+        elapsed = self.scheduler.now or 1.0
+
+        def link_stats(links):
+            return {
+                'sent': sum(link.sent for link in links),
+                'dropped': sum(link.dropped for link in links),
+                'peak_utilization': max(link.busy / elapsed for link in links),
+            }
+
+        return {
+            'simulated_s': self.scheduler.now,
+            'wall_s': wall_s,
+            'speedup': self.scheduler.now / wall_s if wall_s else 0.0,
+            'events': self.scheduler.processed,
+            'executed': self.execute,
+            'completed': len(self.latencies),
+            'abandoned': self.abandoned,
+            'throughput_per_s': len(self.latencies) / duration_s,
+            'latency_ms': summarize_latencies(self.latencies),
+            'mean_attempts': sum(self.attempts) / len(self.attempts) if self.attempts else 0.0,
+            'rejections': self.rejections,
+            'links': {
+                'v2i_up': link_stats(self.uplink),
+                'v2i_down': link_stats(self.downlink),
+                'f2c_up': link_stats(self.f2c_up),
+                'f2c_down': link_stats(self.f2c_down),
+            },
+            'peak_utilization': {
+                'fog_node': max(cpu.busy / elapsed for cpu in self.fog_cpu),
+                'cloud_server': self.cs_cpu.busy / elapsed,
+            },
+        }
+
+
+def phase_costs_from_benchmarks(benchmark_results: Dict[str, float], phase_ops) -> Dict[str, float]:
+    # Seconds per phase; phase_ops is {phase: {operation: count}} from measure_phase_operation_counts
+    return {
+        phase: (ops.get('hash', 0) * benchmark_results['T_h']
+                + ops.get('scalar_mult', 0) * benchmark_results['T_sm']) / 1000
+        for phase, ops in phase_ops.items()
+    }
+
+
+def print_des_results(results: dict):
+
+    print("\n" + "="*60)
+    print("DISCRETE-EVENT NETWORK SIMULATION")
+    print("="*60)
+    print(f"\n  Simulated / wall time:   {results['simulated_s']:.1f} s / {results['wall_s']:.2f} s "
+          f"(x{results['speedup']:.0f})")
+    print(f"  Events processed:        {results['events']}")
+    print(f"  Scheme code executed:    {results['executed']}")
+    print(f"  Completed / abandoned:   {results['completed']} / {results['abandoned']}")
+    print(f"  Throughput:              {results['throughput_per_s']:.2f} handshakes/s")
+    print(f"  Mean attempts:           {results['mean_attempts']:.3f}")
+    print(f"  Peak fog node / CS load: {results['peak_utilization']['fog_node']:.1%} / "
+          f"{results['peak_utilization']['cloud_server']:.1%}")
+    print(f"\nEnd-to-end latency:")
+    for name, value in results['latency_ms'].items():
+        print(f"  {name:<24} {value:.4f} ms")
+    print(f"\nLinks (sent / dropped / peak utilization):")
+    for name, stats in results['links'].items():
+        print(f"  {name:<24} {stats['sent']} / {stats['dropped']} / {stats['peak_utilization']:.1%}")
+    if results['rejections']:
+        print(f"\nRejections:")
+        for reason, count in results['rejections'].items():
+            print(f"  {count:>8}  {reason}")
+    print(f"{'-'*60}\n")
+
+
+@hydra.main(version_base=None, config_path="configs", config_name="des")
+def main(cfg: DictConfig):
+    if cfg.provider:
+        set_provider(cfg.provider)
+    # Hashes and scalar multiplications counted in one real handshake, priced at T_h and T_sm
+    phase_ops = {phase: ops for phase, ops in measure_phase_operation_counts().items() if phase != 'login'}
+    phase_costs = phase_costs_from_benchmarks(run_benchmarks(cfg, only=('T_h', 'T_sm')), phase_ops)
+    message_bits = calculate_communication_cost(cfg)
+
+    simulation = NetworkSimulation(
+        cfg.vehicles, cfg.fog_nodes, cfg.arrival, phase_costs, message_bits, cfg.links.v2i, cfg.links.f2c,
+        cfg.retry_timeout_ms, cfg.max_retries, cfg.execute, cfg.trace_limit, cfg.seed,
+    )
+    results = simulation.run(cfg.duration_s)
+    print_des_results(results)
+
+    output_dir = Path(cfg.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / "des_results.json"
+    with open(output_file, 'w') as f:
+        json.dump({
+            'crypto_provider': get_provider().name,
+            'phase_costs_ms': {phase: cost * 1000 for phase, cost in phase_costs.items()},
+            'phase_operations': phase_ops,
+            'results': results,
+            'configuration': OmegaConf.to_container(cfg, resolve=True),
+        }, f, indent=2)
+    print(f"Results saved to: {output_file}")
+
+    if simulation.trace:
+        trace_file = output_dir / "des_timeline.jsonl"
+        with open(trace_file, 'w') as f:
+            for event in simulation.trace:
+                f.write(json.dumps(event) + "\n")
+        print(f"Timeline saved to: {trace_file}")
+
+
+if __name__ == "__main__":
+    main()
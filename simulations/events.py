@@ -0,0 +1,56 @@
+import heapq
+import itertools
+import time
+
+
+class EventScheduler:
+    # Heap of (time, sequence, callback, args). Times count from the start of the run in
+    # a unit chosen by the caller (des uses seconds, fleet milliseconds); unit is its
+    # length in seconds. clock() gives the matching wall-clock time in seconds and can
+    # be installed with set_clock.
+    def __init__(self, epoch=None, unit=1.0):
+        self.now = 0.0
+        self.epoch = time.time() if epoch is None else epoch
+        self.unit = unit
+        self.processed = 0
+        self._queue = []
+        self._sequence = itertools.count()
+
+    def clock(self):
+        return self.epoch + self.now * self.unit
+
+    def at(self, when, callback, *args):
+
+        heapq.heappush(self._queue, (when, next(self._sequence), callback, args))
+
+    def schedule(self, delay, callback, *args):
+
+        self.at(self.now + delay, callback, *args)
+
+    def run(self, until=None):
+
+        queue = self._queue
+        while queue:
+            if until is not None and queue[0][0] > until:
+                self.now = until
+                return
+            self.now, _, callback, args = heapq.heappop(queue)
+            self.processed += 1
+            callback(*args)
+
+
+class Processor:
+    # Single FIFO server; jobs finish in submission order
+    __slots__ = ('scheduler', 'free_at', 'busy')
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.free_at = 0.0
+        self.busy = 0.0
+
+    def submit(self, cost, callback, *args):
+
+        start = max(self.scheduler.now, self.free_at)
+        self.free_at = start + cost
+        self.busy += cost
+        self.scheduler.at(self.free_at, callback, *args)
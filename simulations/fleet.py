@@ -0,0 +1,224 @@
+import json
+import random
+import secrets
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, List
+
+import hydra
+from omegaconf import DictConfig, OmegaConf
+
+from scheme import CloudServer, FogNode, Vehicle
+from scheme.common import get_provider, random_nonce, set_provider, trace_operations
+from simulations.benchmarks import run_benchmarks
+from simulations.computational_cost import calculate_computational_cost
+from simulations.events import EventScheduler, Processor
+from simulations.loopback import summarize_latencies
+
+# Handshake phases, the entity that runs each one and the message it produces
+PHASES = (
+    ('M1', 'vehicle'),        # generate_m1
+    ('M2', 'fog_node'),       # generate_m2
+    ('M3', 'cloud_server'),   # handle_m2
+    ('M4', 'fog_node'),       # generate_m4
+    ('SK', 'vehicle'),        # establish_session_key
+)
+
+
+def arrival_rate(arrival_cfg, t: float) -> float:
+    # poisson uses a constant rate; rush_hour switches to burst_rate for
+    # burst_duration seconds at the start of every burst_period
+    if arrival_cfg.process == 'poisson':
+        return arrival_cfg.rate
+    if arrival_cfg.process == 'rush_hour':
+        if t % arrival_cfg.burst_period < arrival_cfg.burst_duration:
+            return arrival_cfg.burst_rate
+        return arrival_cfg.rate
+    raise ValueError(f"Unknown arrival process: {arrival_cfg.process}")
+
+
+def generate_arrivals(n: int, arrival_cfg, rng: random.Random) -> List[float]:
+    # Arrival times in seconds
+    arrivals = []
+    t = 0.0
+    for _ in range(n):
+        t += rng.expovariate(arrival_rate(arrival_cfg, t))
+        arrivals.append(t)
+    return arrivals
+
+
+def build_fleet(n_vehicles: int, n_fog_nodes: int):
+    
+    cs = CloudServer(random_nonce())
+    fog_nodes = []
+    for _ in range(n_fog_nodes):
+        fog = FogNode(secrets.token_bytes(8))
+        fog.register(cs)
+        fog_nodes.append(fog)
+    vehicles = []
+    for _ in range(n_vehicles):
+        vehicle = Vehicle(secrets.token_bytes(8), secrets.token_bytes(8))
+        vehicle.register(cs)
+        vehicles.append(vehicle)
+    return cs, fog_nodes, vehicles
+
+
+def run_handshake(vehicle: Vehicle, fog: FogNode, cs: CloudServer) -> List[float]:
+    # Runs M1-M4 and returns the compute time of each phase in ms
+    times = []
+    start = time.perf_counter()
+    M1 = vehicle.generate_m1(fog.FID_j, fog.storage['B_j'])
+    times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    M2 = fog.generate_m2(*M1)
+    times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    M3 = cs.handle_m2(*M2, fog.FID_j)
+    times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    M4 = fog.generate_m4(*M3)
+    times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    session_key = vehicle.establish_session_key(*M4, fog.FID_j)
+    times.append(time.perf_counter() - start)
+    if session_key != fog.session_key:
+        raise ValueError("Fleet: session keys differ. Aborting.")
+    return [t * 1000 for t in times]
+
+
+def simulate_fleet(n_vehicles: int, n_fog_nodes: int, handshakes: int, arrival_cfg,
+                   link_latency_ms: float = 0.0, seed: int = 0) -> dict:
+    # Handshakes run for real, one after another. Their measured compute times are
+    # then replayed on a virtual timeline (simulations.events, in ms) where every
+    # vehicle, fog node and the CS is a single FIFO server. Each phase joins its
+    # server's queue when its input message arrives, and every message spends
+    # link_latency_ms on the wire.
+    rng = random.Random(seed)
+    cs, fog_nodes, vehicles = build_fleet(n_vehicles, n_fog_nodes)
+    arrivals = generate_arrivals(handshakes, arrival_cfg, rng)
+
+    scheduler = EventScheduler(unit=0.001)  # Milliseconds
+    fog_cpu = [Processor(scheduler) for _ in range(n_fog_nodes)]
+    cs_cpu = Processor(scheduler)
+    vehicle_cpu = {}  # vehicle index -> Processor, created on first use
+    service = {phase: [] for phase, _ in PHASES}
+    waiting = {phase: [] for phase, _ in PHASES}
+    entity_ms = {'vehicle': [], 'fog_node': [], 'cloud_server': []}
+    end_to_end = []
+
+    def run_phase(step, servers, phase_ms, arrival, per_entity):
+        # The input to PHASES[step] has just arrived at its server
+        entity = PHASES[step][1]
+        servers[entity].submit(phase_ms[step], phase_done, step, servers, phase_ms, arrival, per_entity, scheduler.now)
+
+    def phase_done(step, servers, phase_ms, arrival, per_entity, queued_at):
+
+        phase, entity = PHASES[step]
+        cost = phase_ms[step]
+        waiting[phase].append(scheduler.now - cost - queued_at)
+        service[phase].append(cost)
+        per_entity[entity] += cost
+        if step + 1 < len(PHASES):
+            scheduler.schedule(link_latency_ms, run_phase, step + 1, servers, phase_ms, arrival, per_entity)
+            return
+        for name, total in per_entity.items():
+            entity_ms[name].append(total)
+        end_to_end.append(scheduler.now - arrival)
+
+    failures = 0
+    for arrival in arrivals:
+        index = rng.randrange(n_vehicles)
+        # Vehicles are spread evenly over the fog nodes
+        vehicle, fog = vehicles[index], fog_nodes[index % n_fog_nodes]
+        try:
+            phase_ms = run_handshake(vehicle, fog, cs)
+        except ValueError:
+            failures += 1
+            continue
+        if index not in vehicle_cpu:
+            vehicle_cpu[index] = Processor(scheduler)
+        servers = {'vehicle': vehicle_cpu[index], 'fog_node': fog_cpu[index % n_fog_nodes], 'cloud_server': cs_cpu}
+        scheduler.at(arrival * 1000, run_phase, 0, servers, phase_ms, arrival * 1000, dict.fromkeys(entity_ms, 0.0))
+    scheduler.run()
+
+    last_done = scheduler.now
+    makespan_s = last_done / 1000
+    completed = len(end_to_end)
+
+    def utilization(processors):
+        return max((p.busy / last_done for p in processors), default=0.0) if last_done else 0.0
+
+    return {
+        'vehicles': n_vehicles,
+        'fog_nodes': n_fog_nodes,
+        'process': arrival_cfg.process,
+        'completed': completed,
+        'failed': failures,
+        'offered_rate_per_s': handshakes / arrivals[-1] if arrivals else 0.0,
+        'throughput_per_s': completed / makespan_s if makespan_s else 0.0,
+        'latency_ms': summarize_latencies(end_to_end),
+        'phase_compute_ms': {phase: summarize_latencies(values) for phase, values in service.items()},
+        'phase_wait_ms': {phase: summarize_latencies(values) for phase, values in waiting.items()},
+        'entity_compute_ms': {entity: summarize_latencies(values) for entity, values in entity_ms.items()},
+        'peak_utilization': {'fog_node': utilization(fog_cpu), 'cloud_server': utilization([cs_cpu])},
+    }
+
+
+def print_fleet_results(results: dict, analytic: Dict[str, float] = None):
+    
+    print("\n" + "="*60)
+    print("FLEET SIMULATION")
+    print("="*60)
+    print(f"\n  Crypto provider:         {get_provider().name}")
+    print(f"  Vehicles / fog nodes:    {results['vehicles']} / {results['fog_nodes']}")
+    print(f"  Arrival process:         {results['process']}")
+    print(f"  Completed / failed:      {results['completed']} / {results['failed']}")
+    print(f"  Offered load:            {results['offered_rate_per_s']:.2f} handshakes/s")
+    print(f"  Throughput:              {results['throughput_per_s']:.2f} handshakes/s")
+    print(f"  Peak fog node / CS load: {results['peak_utilization']['fog_node']:.1%} / "
+          f"{results['peak_utilization']['cloud_server']:.1%}")
+
+    print(f"\n  {'ms':<24} {'p50':>9} {'p95':>9} {'p99':>9}")
+    stats = results['latency_ms']
+    print(f"  {'End-to-end':<24} {stats['p50']:9.3f} {stats['p95']:9.3f} {stats['p99']:9.3f}")
+    for phase, entity in PHASES:
+        stats = results['phase_compute_ms'][phase]
+        wait = results['phase_wait_ms'][phase]
+        print(f"  {phase + ' (' + entity + ')':<24} {stats['p50']:9.3f} {stats['p95']:9.3f} {stats['p99']:9.3f}"
+              f"  wait p99 {wait['p99']:.3f}")
+
+    print(f"\n  {'Per entity, ms':<24} {'mean':>9} {'p99':>9} {'analytic':>9}")
+    for entity, stats in results['entity_compute_ms'].items():
+        expected = f"{analytic[entity]:9.3f}" if analytic else f"{'-':>9}"
+        print(f"  {entity:<24} {stats['mean']:9.3f} {stats['p99']:9.3f} {expected}")
+    print(f"{'-'*60}\n")
+
+
+@hydra.main(version_base=None, config_path="configs", config_name="fleet")
+def main(cfg: DictConfig):
+    if cfg.provider:
+        set_provider(cfg.provider)
+    with trace_operations(cfg.trace_output) if cfg.trace_output else nullcontext():
+        results = simulate_fleet(cfg.vehicles, cfg.fog_nodes, cfg.handshakes, cfg.arrival,
+                                 cfg.link_latency_ms, cfg.seed)
+    analytic = None
+    if cfg.compare_analytic:
+        analytic = calculate_computational_cost(run_benchmarks(cfg), cfg)
+        results['analytic_ms'] = {entity: analytic[entity] for entity in ('vehicle', 'fog_node', 'cloud_server')}
+    print_fleet_results(results, analytic)
+
+    output_dir = Path(cfg.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f"fleet_results_{cfg.arrival.process}.json"
+    with open(output_file, 'w') as f:
+        json.dump({
+            'crypto_provider': get_provider().name,
+            'results': results,
+            'configuration': OmegaConf.to_container(cfg, resolve=True),
+        }, f, indent=2)
+    print(f"Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import json
+import secrets
+import time
+from pathlib import Path
+from typing import Dict
+
+import hydra
+from omegaconf import DictConfig, OmegaConf
+
+from scheme import CloudServer, FogNode, Vehicle
+from scheme.common import get_provider, random_nonce, set_provider
+from simulations.loopback import summarize_latencies
+
+
+def full_authentication(vehicle: Vehicle, fog: FogNode, cs: CloudServer) -> bytes:
+    
+    M1 = vehicle.generate_m1(fog.FID_j, fog.storage['B_j'])
+    M2 = fog.generate_m2(*M1)
+    M3 = cs.handle_m2(*M2, fog.FID_j)
+    M4 = fog.generate_m4(*M3)
+    return vehicle.establish_session_key(*M4, fog.FID_j)
+
+
+def handover(vehicle: Vehicle, session_key: bytes, current: FogNode, nxt: FogNode) -> bytes:
+    
+    # Fog-to-fog context transfer, then one vehicle <-> next fog node exchange
+    nxt.import_handover(*current.export_handover(session_key, nxt.FID_j))
+    vehicle.prepare_handover(nxt.FID_j)
+    session_key, response = nxt.resume_session(*vehicle.resume_request(nxt.FID_j))
+    vehicle.complete_resumption(*response)
+    return session_key
+
+
+def network_latency(links) -> Dict[str, float]:
+    # One-way link latencies on each method's critical path, in ms:
+    # M1 and M4 over V2I, M2 and M3 over the backhaul; handover sends the context
+    # fog-to-fog, then the resumption request and response over V2I
+    return {
+        'full_authentication': 2 * links.v2i.latency_ms + 2 * links.f2c.latency_ms,
+        'handover': links.f2f.latency_ms + 2 * links.v2i.latency_ms,
+    }
+
+
+def measure_handover(iterations: int) -> Dict[str, Dict[str, float]]:
+    cs = CloudServer(random_nonce())
+    fogs = [FogNode(secrets.token_bytes(8)) for _ in range(2)]
+    for fog in fogs:
+        fog.register(cs)
+    K_handover = cs.provision_handover_key(fogs[0].FID_j, fogs[1].FID_j)
+    fogs[0].add_neighbour(fogs[1].FID_j, K_handover)
+    fogs[1].add_neighbour(fogs[0].FID_j, K_handover)
+    vehicle = Vehicle(secrets.token_bytes(8), secrets.token_bytes(8))
+    vehicle.register(cs)
+    session_key = full_authentication(vehicle, fogs[0], cs)
+
+    full_ms, handover_ms = [], []
+    current = 0
+    for i in range(iterations):
+        # One move per iteration between the two fog nodes, alternating the method,
+        # so both methods are measured in both directions
+        nxt = 1 - current
+        start = time.perf_counter()
+        if i % 2 == 0:
+            session_key = full_authentication(vehicle, fogs[nxt], cs)
+            full_ms.append((time.perf_counter() - start) * 1000)
+        else:
+            session_key = handover(vehicle, session_key, fogs[current], fogs[nxt])
+            handover_ms.append((time.perf_counter() - start) * 1000)
+        current = nxt
+
+    return {
+        'full_authentication_ms': summarize_latencies(full_ms),
+        'handover_ms': summarize_latencies(handover_ms),
+    }
+
+
+def print_handover(results: Dict[str, Dict[str, float]], network_ms: Dict[str, float]):
+    
+    print("\n" + "="*60)
+    print("HANDOVER LATENCY VS. FULL RE-AUTHENTICATION")
+    print("="*60)
+    print(f"\n  Crypto provider:         {get_provider().name}")
+    methods = (('Full re-authentication', 'full_authentication'), ('Fog-to-fog handover', 'handover'))
+    for title, offset in (('Compute only', False), ('With link latency', True)):
+        print(f"\n  {title:<24} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for label, method in methods:
+            stats = results[f'{method}_ms']
+            extra = network_ms[method] if offset else 0.0
+            print(f"  {label:<24} " + " ".join(f"{stats[q] + extra:9.3f}" for q in ('mean', 'p50', 'p95', 'p99'))
+                  + "  ms")
+    print()
+    for title, extra in (('compute only', 0.0), ('with link latency', 1.0)):
+        full = results['full_authentication_ms']['mean'] + extra * network_ms['full_authentication']
+        fast = results['handover_ms']['mean'] + extra * network_ms['handover']
+        print(f"  Handover speed-up, {title + ':':<19} x{full / fast:.1f}")
+    print(f"{'-'*60}\n")
+
+
+@hydra.main(version_base=None, config_path="configs", config_name="handover")
+def main(cfg: DictConfig):
+    if cfg.provider:
+        set_provider(cfg.provider)
+    results = measure_handover(cfg.iterations)
+    network_ms = network_latency(cfg.links)
+    print_handover(results, network_ms)
+
+    output_dir = Path(cfg.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / "handover_results.json"
+    with open(output_file, 'w') as f:
+        json.dump({
+            'crypto_provider': get_provider().name,
+            'results': results,
+            'network_ms': network_ms,
+            'configuration': OmegaConf.to_container(cfg, resolve=True),
+        }, f, indent=2)
+    print(f"Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import argparse
+import json
+import math
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from simulations.stats import t_cdf
+
+DEFAULT_HISTORY = Path("simulations/results/history.jsonl")
+# T_hs is the end-to-end handshake time
+DEFAULT_OPERATIONS = ('T_h', 'T_sm', 'T_hs')
+
+
+def git_revision() -> Dict[str, object]:
+    # Commit of the working tree, and whether it has uncommitted changes
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit, 'dirty': bool(status.strip())}
+
+
+def append_run(history_path, results: dict) -> dict:
+    # Appends one record, keyed by git commit, device profile and environment fingerprint
+    environment = results.get('environment') or {}
+    record = {
+        'run_id': uuid.uuid4().hex[:12],
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git': git_revision(),
+        'device': results['device'],
+        'environment_id': environment.get('id'),
+        'environment': environment,
+        'crypto_provider': results.get('crypto_provider'),
+        'benchmarks': results['benchmarks'],
+        'benchmark_stats': results.get('benchmark_stats', {}),
+    }
+    history_path = Path(history_path)
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_path, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+    return record
+
+
+def load_history(history_path) -> List[dict]:
+
+    history_path = Path(history_path)
+    if not history_path.exists():
+        return []
+    with open(history_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def select_run(runs: List[dict], selector: str) -> dict:
+    # '@N' is an index into the history ('@-1' is the latest run); anything else is a
+    # run id or git commit prefix. Several runs of one commit resolve to the latest,
+    # a prefix that matches more than one run id or commit is an error.
+    if selector.startswith('@'):
+        try:
+            return runs[int(selector[1:])]
+        except ValueError:
+            raise ValueError(f"History: '{selector}' is not an index such as @-1.")
+        except IndexError:
+            raise ValueError(f"History: no run at index {selector[1:]}.")
+    matches = {}
+    for run in runs:
+        if run['run_id'].startswith(selector):
+            matches[run['run_id']] = run
+        elif (run['git']['commit'] or '').startswith(selector):
+            matches[run['git']['commit']] = run  # Latest run for a commit
+    if not matches:
+        hint = " Use @N for an index." if selector.lstrip('-').isdigit() else ""
+        raise ValueError(f"History: no run matches '{selector}'.{hint}")
+    if len(matches) > 1:
+        raise ValueError(f"History: '{selector}' is ambiguous, it matches {', '.join(sorted(matches))}.")
+    return next(iter(matches.values()))
+
+
+def welch_test(base: dict, new: dict) -> Optional[Dict[str, float]]:
+    # One-sided Welch's t-test that new's mean is larger than base's, from summary statistics
+    n1, n2 = base['samples'], new['samples']
+    if n1 < 2 or n2 < 2:
+        return None
+    v1, v2 = base['stddev'] ** 2 / n1, new['stddev'] ** 2 / n2
+    se = math.sqrt(v1 + v2)
+    if se == 0:
+        return None
+    t = (new['mean'] - base['mean']) / se
+    df = (v1 + v2) ** 2 / (v1 ** 2 / (n1 - 1) + v2 ** 2 / (n2 - 1))
+    return {'t': t, 'df': df, 'p_value': 1.0 - t_cdf(t, df)}
+
+
+def compare_runs(base: dict, new: dict, operations=DEFAULT_OPERATIONS, alpha: float = 0.01,
+                 threshold: float = 0.05) -> List[dict]:
+    # A regression is a slowdown of more than threshold (relative) with p < alpha
+    rows = []
+    for op in operations:
+        base_stats = base['benchmark_stats'].get(op)
+        new_stats = new['benchmark_stats'].get(op)
+        if base_stats is None or new_stats is None:
+            rows.append({'operation': op, 'status': 'missing'})
+            continue
+        change = new_stats['mean'] / base_stats['mean'] - 1.0
+        test = welch_test(base_stats, new_stats)
+        significant = test is not None and test['p_value'] < alpha
+        if significant and change > threshold:
+            status = 'REGRESSION'
+        elif test is not None and change < -threshold and 1.0 - test['p_value'] < alpha:
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append({
+            'operation': op,
+            'base_ms': base_stats['mean'],
+            'new_ms': new_stats['mean'],
+            'change': change,
+            'p_value': test['p_value'] if test else None,
+            'status': status,
+        })
+    return rows
+
+
+def _describe(run: dict) -> str:
+
+    commit = (run['git']['commit'] or 'unknown')[:10] + ('+dirty' if run['git']['dirty'] else '')
+    return f"{run['run_id']}  {run['recorded_at']}  {commit}  {run['device']['type']}  env {run['environment_id']}"
+
+
+def print_comparison(base: dict, new: dict, rows: List[dict]):
+
+    print(f"\n  Base: {_describe(base)}")
+    print(f"  New:  {_describe(new)}")
+    if base['environment_id'] != new['environment_id']:
+        print("  Warning: environment fingerprints differ; timings may not be comparable.")
+    print(f"\n  {'op':<6} {'base ms':>12} {'new ms':>12} {'change':>9} {'p':>9}  status")
+    for row in rows:
+        if row['status'] == 'missing':
+            print(f"  {row['operation']:<6} {'-':>12} {'-':>12} {'-':>9} {'-':>9}  missing")
+            continue
+        p_value = f"{row['p_value']:.4f}" if row['p_value'] is not None else '-'
+        print(f"  {row['operation']:<6} {row['base_ms']:12.6f} {row['new_ms']:12.6f} {row['change']:+9.1%} "
+              f"{p_value:>9}  {row['status']}")
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m simulations.history',
+        description="List benchmark runs recorded by run_simulation and compare two of them for regressions.",
+    )
+    parser.add_argument('--history', default=str(DEFAULT_HISTORY), help="History file (JSON lines)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help="Show recorded runs")
+    list_parser.add_argument('--device', help="Only runs for this device type")
+
+    compare_parser = commands.add_parser('compare', help="Exit with status 1 if new regresses against base")
+    compare_parser.add_argument('base', nargs='?', default='@-2', help="Run id, commit prefix or @index (default @-2)")
+    compare_parser.add_argument('new', nargs='?', default='@-1', help="Run id, commit prefix or @index (default @-1)")
+    compare_parser.add_argument('--device', help="Only runs for this device type")
+    compare_parser.add_argument('--ops', nargs='+', default=list(DEFAULT_OPERATIONS), help="Operations to compare")
+    compare_parser.add_argument('--alpha', type=float, default=0.01, help="Significance level")
+    compare_parser.add_argument('--threshold', type=float, default=0.05,
+                                help="Smallest relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    runs = load_history(args.history)
+    if args.device:
+        runs = [run for run in runs if run['device']['type'] == args.device]
+    if not runs:
+        print(f"No runs recorded in {args.history}.")
+        return 0
+
+    if args.command == 'list':
+        for i, run in enumerate(runs):
+            print(f"@{i:<4} {_describe(run)}")
+        return 0
+
+    try:
+        base, new = select_run(runs, args.base), select_run(runs, args.new)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    rows = compare_runs(base, new, args.ops, args.alpha, args.threshold)
+    print_comparison(base, new, rows)
+    return 1 if any(row['status'] == 'REGRESSION' for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import secrets
+import statistics
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, List
+
+import hydra
+from omegaconf import DictConfig, OmegaConf
+
+from scheme import CloudServer, FogNode, Vehicle
+from scheme.common import random_nonce, trace_operations
+from scheme.admission import AdmissionController
+from scheme.gateway import CloudServerGateway, FogNodeGateway, authenticate_vehicle
+from scheme.replay import ReplayCache
+
+
+def summarize_latencies(latencies_ms: List[float]) -> Dict[str, float]:
+    
+    if len(latencies_ms) < 2:
+        value = latencies_ms[0] if latencies_ms else 0.0
+        return {'mean': value, 'p50': value, 'p95': value, 'p99': value, 'max': value}
+    cuts = statistics.quantiles(latencies_ms, n=100, method='inclusive')
+    return {
+        'mean': statistics.mean(latencies_ms),
+        'p50': cuts[49],
+        'p95': cuts[94],
+        'p99': cuts[98],
+        'max': max(latencies_ms),
+    }
+
+
+async def run_loopback(n_vehicles: int, concurrency: int, transport: str = 'tcp', socket_dir: str = '/tmp',
+                       admission_cfg: dict = None, workers: int = 0) -> dict:
+    cs = CloudServer(random_nonce())
+    FID_j = secrets.token_bytes(8)
+    fog = FogNode(FID_j, replay_cache=ReplayCache() if admission_cfg else None)
+    fog.register(cs)
+    if workers:
+        fog.start_executor(workers)
+    admission = None
+    if admission_cfg:
+        admission = AdmissionController(fog, admission_cfg['max_queue'], admission_cfg['rate'], admission_cfg['burst'])
+    vehicles = []
+    for _ in range(n_vehicles):
+        vehicle = Vehicle(secrets.token_bytes(8), secrets.token_bytes(8))
+        vehicle.register(cs)
+        vehicles.append(vehicle)
+
+    if transport == 'unix':
+        cs_address = os.path.join(socket_dir, f"ris_cs_{os.getpid()}.sock")
+        fog_address = os.path.join(socket_dir, f"ris_fog_{os.getpid()}.sock")
+    else:
+        cs_address = fog_address = ('127.0.0.1', 0)
+
+    cs_gateway = CloudServerGateway(cs)
+    cs_address = await cs_gateway.start(cs_address)
+    fog_gateway = FogNodeGateway(fog, cs_address, admission=admission)
+    fog_address = await fog_gateway.start(fog_address)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def handshake(vehicle):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await authenticate_vehicle(vehicle, FID_j, fog.storage['B_j'], fog_address)
+            except (ValueError, ConnectionError):
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(handshake(vehicle) for vehicle in vehicles))
+    finally:
+        elapsed = time.perf_counter() - start
+        # Workers restarted after an epoch wipe hold copies of the open sockets; stop them first
+        fog.shutdown_executor()
+        await fog_gateway.close()
+        await cs_gateway.close()
+        if transport == 'unix':
+            for path in (cs_address, fog_address):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    results = {
+        'transport': transport,
+        'vehicles': n_vehicles,
+        'concurrency': concurrency,
+        'workers': workers,
+        'completed': len(latencies),
+        'failed': failures,
+        'elapsed_s': elapsed,
+        'throughput_per_s': len(latencies) / elapsed if elapsed else 0.0,
+        'latency_ms': summarize_latencies(latencies),
+    }
+    if admission is not None:
+        results['admission'] = admission.metrics()
+    if fog.replay_cache is not None:
+        results['replay_cache'] = fog.replay_cache.metrics()
+    return results
+
+
+def print_loopback_results(results: dict):
+    
+    print("\n" + "="*60)
+    print("LOOPBACK GATEWAY LOAD TEST")
+    print("="*60)
+    print(f"\n  Transport:               {results['transport']}")
+    print(f"  Vehicles / concurrency:  {results['vehicles']} / {results['concurrency']}")
+    print(f"  Completed / failed:      {results['completed']} / {results['failed']}")
+    print(f"  Throughput:              {results['throughput_per_s']:.2f} handshakes/s")
+    print(f"\nEnd-to-end latency:")
+    for name, value in results['latency_ms'].items():
+        print(f"  {name:<24} {value:.4f} ms")
+    if 'admission' in results:
+        print(f"\nAdmission control:")
+        for name, value in results['admission'].items():
+            print(f"  {name:<24} {value}")
+    if 'replay_cache' in results:
+        print(f"\nReplay cache:")
+        for name, value in results['replay_cache'].items():
+            print(f"  {name:<24} {value}")
+    print(f"{'-'*60}\n")
+
+
+@hydra.main(version_base=None, config_path="configs", config_name="loopback")
+def main(cfg: DictConfig):
+    admission_cfg = OmegaConf.to_container(cfg.admission) if cfg.admission.enabled else None
+    with trace_operations(cfg.trace_output) if cfg.trace_output else nullcontext():
+        results = asyncio.run(run_loopback(cfg.vehicles, cfg.concurrency, cfg.transport, cfg.socket_dir,
+                                           admission_cfg, cfg.workers))
+    print_loopback_results(results)
+
+    output_dir = Path(cfg.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f"loopback_results_{cfg.transport}.json"
+    with open(output_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+from typing import List, Tuple
+
+# Optimal ate pairing on BN254 (alt_bn128) in pure Python, for benchmarking T_bp.
+# FQ2 = FQ[u] / (u^2 + 1); FQ12 = FQ[w] / (w^12 - 18 w^6 + 82), with u = w^6 - 9.
+# G2 points stay on the sextic twist over FQ2 and are mapped into FQ12 only where
+# line functions are evaluated.
+
+FIELD_MODULUS = 21888242871839275222246405745257275088696311157297823662689037894645226208583
+CURVE_ORDER = 21888242871839275222246405745257275088548364400416034343698204186575808495617
+ATE_LOOP_COUNT = 29793968203157093288  # 6x + 2
+_LOG_ATE_LOOP_COUNT = ATE_LOOP_COUNT.bit_length() - 2  # Top bit is covered by R = Q
+
+_p = FIELD_MODULUS
+
+FQ2 = Tuple[int, int]
+FQ12 = List[int]
+
+G1 = (1, 2)
+G2 = (
+    (10857046999023057135944570762232829481370756359578518086990519993285655852781,
+     11559732032986387107991004021392285783925812861821192530917403151452391805634),
+    (8495653923123431417604973247489272438418190587263600148770280649306958101930,
+     4082367875863433681332203403145435568316851327593401208105741076214120093531),
+)
+
+
+# FQ2
+
+def fq2_add(a: FQ2, b: FQ2) -> FQ2:
+    return (a[0] + b[0]) % _p, (a[1] + b[1]) % _p
+
+def fq2_sub(a: FQ2, b: FQ2) -> FQ2:
+    return (a[0] - b[0]) % _p, (a[1] - b[1]) % _p
+
+def fq2_mul(a: FQ2, b: FQ2) -> FQ2:
+    return (a[0] * b[0] - a[1] * b[1]) % _p, (a[0] * b[1] + a[1] * b[0]) % _p
+
+def fq2_scale(a: FQ2, k: int) -> FQ2:
+    return a[0] * k % _p, a[1] * k % _p
+
+def fq2_inv(a: FQ2) -> FQ2:
+    norm_inv = pow(a[0] * a[0] + a[1] * a[1], -1, _p)
+    return a[0] * norm_inv % _p, -a[1] * norm_inv % _p
+
+def fq2_conj(a: FQ2) -> FQ2:
+    return a[0], -a[1] % _p
+
+def fq2_pow(a: FQ2, e: int) -> FQ2:
+    result = (1, 0)
+    while e:
+        if e & 1:
+            result = fq2_mul(result, a)
+        a = fq2_mul(a, a)
+        e >>= 1
+    return result
+
+
+# FQ12
+
+_FQ12_ONE = [1] + [0] * 11
+
+def fq12_mul(a: FQ12, b: FQ12) -> FQ12:
+    # Schoolbook product, skipping zero coefficients of b (line values are sparse),
+    # then w^12 = 18 w^6 - 82
+    c = [0] * 23
+    for j, bj in enumerate(b):
+        if bj:
+            for i, ai in enumerate(a):
+                c[i + j] += ai * bj
+    for i in range(22, 11, -1):
+        top = c[i]
+        if top:
+            c[i - 6] += 18 * top
+            c[i - 12] -= 82 * top
+    return [x % _p for x in c[:12]]
+
+def fq12_pow(a: FQ12, e: int) -> FQ12:
+    result = _FQ12_ONE
+    for bit in bin(e)[2:]:
+        result = fq12_mul(result, result)
+        if bit == '1':
+            result = fq12_mul(result, a)
+    return result
+
+def fq12_conj(a: FQ12) -> FQ12:
+    # a^(p^6): the odd powers of w change sign
+    return [x if i % 2 == 0 else -x % _p for i, x in enumerate(a)]
+
+def _frobenius_table() -> List[FQ12]:
+    # (w^p)^i for i = 0..11; FQ coefficients are fixed by the Frobenius map
+    w_p = fq12_pow([0, 1] + [0] * 10, _p)
+    table = [_FQ12_ONE]
+    for _ in range(11):
+        table.append(fq12_mul(table[-1], w_p))
+    return table
+
+_FROBENIUS = None
+
+def fq12_frobenius(a: FQ12) -> FQ12:
+    global _FROBENIUS
+    if _FROBENIUS is None:
+        _FROBENIUS = _frobenius_table()
+    c = [0] * 12
+    for ai, wi in zip(a, _FROBENIUS):
+        if ai:
+            for k, x in enumerate(wi):
+                c[k] += ai * x
+    return [x % _p for x in c]
+
+def fq12_inv(a: FQ12) -> FQ12:
+    # a^-1 = (a^p * a^(p^2) * ... * a^(p^11)) / N(a), where the norm N(a) lies in FQ
+    conjugates = _FQ12_ONE
+    b = a
+    for _ in range(11):
+        b = fq12_frobenius(b)
+        conjugates = fq12_mul(conjugates, b)
+    norm = fq12_mul(a, conjugates)[0]
+    norm_inv = pow(norm, -1, _p)
+    return [x * norm_inv % _p for x in conjugates]
+
+
+# Curve arithmetic: E: y^2 = x^3 + 3 over FQ, twist E': y^2 = x^3 + 3 / (9 + u) over FQ2.
+# Points are affine tuples; None is the point at infinity.
+
+def g1_add(P, Q):
+    if P is None:
+        return Q
+    if Q is None:
+        return P
+    (x1, y1), (x2, y2) = P, Q
+    if x1 == x2:
+        if (y1 + y2) % _p == 0:
+            return None
+        m = 3 * x1 * x1 * pow(2 * y1, -1, _p) % _p
+    else:
+        m = (y2 - y1) * pow(x2 - x1, -1, _p) % _p
+    x3 = (m * m - x1 - x2) % _p
+    return x3, (m * (x1 - x3) - y1) % _p
+
+def g1_mul(k: int, P):
+    result = None
+    while k:
+        if k & 1:
+            result = g1_add(result, P)
+        P = g1_add(P, P)
+        k >>= 1
+    return result
+
+def _g2_slope(R, S):
+    # Slope of the line through R and S (the tangent when R == S); None if vertical
+    (x1, y1), (x2, y2) = R, S
+    if x1 != x2:
+        return fq2_mul(fq2_sub(y2, y1), fq2_inv(fq2_sub(x2, x1)))
+    if y1 == y2 and y1 != (0, 0):
+        return fq2_mul(fq2_scale(fq2_mul(x1, x1), 3), fq2_inv(fq2_scale(y1, 2)))
+    return None
+
+def _g2_add_with_slope(R, S, m):
+    (x1, y1), (x2, _) = R, S
+    x3 = fq2_sub(fq2_sub(fq2_mul(m, m), x1), x2)
+    return x3, fq2_sub(fq2_mul(m, fq2_sub(x1, x3)), y1)
+
+def g2_add(R, S):
+    if R is None:
+        return S
+    if S is None:
+        return R
+    m = _g2_slope(R, S)
+    return None if m is None else _g2_add_with_slope(R, S, m)
+
+def g2_neg(R):
+    return None if R is None else (R[0], fq2_sub((0, 0), R[1]))
+
+def g2_mul(k: int, R):
+    result = None
+    while k:
+        if k & 1:
+            result = g2_add(result, R)
+        R = g2_add(R, R)
+        k >>= 1
+    return result
+
+def _g2_frobenius(R):
+    # Untwist-Frobenius-twist: (x, y) -> (conj(x) * xi^((p-1)/3), conj(y) * xi^((p-1)/2))
+    x, y = R
+    return fq2_mul(fq2_conj(x), _GAMMA_X), fq2_mul(fq2_conj(y), _GAMMA_Y)
+
+_XI = (9, 1)
+_GAMMA_X = fq2_pow(_XI, (_p - 1) // 3)
+_GAMMA_Y = fq2_pow(_XI, (_p - 1) // 2)
+
+
+# Pairing
+
+def _line(R, S, P) -> Tuple[FQ12, tuple]:
+    # Line through the twisted points R, S evaluated at P in G1, as a sparse FQ12
+    # element, together with R + S. With slope m over FQ2 the line is
+    # -y_P + x_P * m * w + (y_R - m * x_R) * w^3, where a + b u = (a - 9b) + b w^6.
+    x_P, y_P = P
+    m = _g2_slope(R, S)
+    if m is None:
+        # Vertical line x_P - x_R * w^2
+        x0, x1 = R[0]
+        line = [x_P, 0, -(x0 - 9 * x1) % _p, 0, 0, 0, 0, 0, -x1 % _p, 0, 0, 0]
+        return line, None
+    c = fq2_sub(R[1], fq2_mul(m, R[0]))
+    line = [-y_P % _p, x_P * (m[0] - 9 * m[1]) % _p, 0, (c[0] - 9 * c[1]) % _p,
+            0, 0, 0, x_P * m[1] % _p, 0, c[1], 0, 0]
+    return line, _g2_add_with_slope(R, S, m)
+
+def miller_loop(Q, P) -> FQ12:
+
+    if Q is None or P is None:
+        return _FQ12_ONE
+    R = Q
+    f = _FQ12_ONE
+    for i in range(_LOG_ATE_LOOP_COUNT, -1, -1):
+        line, R = _line(R, R, P)
+        f = fq12_mul(fq12_mul(f, f), line)
+        if ATE_LOOP_COUNT >> i & 1:
+            line, R = _line(R, Q, P)
+            f = fq12_mul(f, line)
+    Q1 = _g2_frobenius(Q)
+    nQ2 = g2_neg(_g2_frobenius(Q1))
+    line, R = _line(R, Q1, P)
+    f = fq12_mul(f, line)
+    line, _ = _line(R, nQ2, P)
+    return fq12_mul(f, line)
+
+_HARD_EXPONENT = (_p ** 4 - _p ** 2 + 1) // CURVE_ORDER
+
+def final_exponentiation(f: FQ12) -> FQ12:
+    # f^((p^12 - 1) / n) = ((f^(p^6 - 1))^(p^2 + 1))^((p^4 - p^2 + 1) / n)
+    f = fq12_mul(fq12_conj(f), fq12_inv(f))
+    f = fq12_mul(fq12_frobenius(fq12_frobenius(f)), f)
+    return fq12_pow(f, _HARD_EXPONENT)
+
+def pairing(Q, P) -> FQ12:
+    # e(Q, P) for Q in G2 (twist coordinates) and P in G1
+    return final_exponentiation(miller_loop(Q, P))
@@ -4,9 +4,11 @@ import json
 from pathlib import Path
 import sys
 
-from simulations.benchmarks import run_benchmarks
+from simulations.benchmarks import create_benchmark, print_benchmark_stats
 from simulations.computational_cost import calculate_computational_cost, print_computational_cost
 from simulations.communication_cost import calculate_communication_cost, print_communication_cost
+from simulations.history import append_run
+from scheme.common import get_provider
 
 
 @hydra.main(version_base=None, config_path="configs", config_name="config")
@@ -23,11 +25,11 @@ def main(cfg: DictConfig):
     
     # 1. Run benchmarks
     print("Phase 1: Benchmarking atomic operations...")
-    benchmark_results = run_benchmarks(cfg)
+    benchmark = create_benchmark(cfg)
+    benchmark_results = benchmark.run_all_benchmarks()
     
     print(f"\nBenchmark Results for {device_name}:")
-    for op, time_ms in benchmark_results.items():
-        print(f"  {op}: {time_ms:.6f} ms")
+    print_benchmark_stats(benchmark.stats, benchmark.confidence)
     
     # 2. Calculate computational cost
     print("\nPhase 2: Calculating computational costs...")
@@ -49,13 +51,17 @@ def main(cfg: DictConfig):
             'type': device_type,
             'specs': OmegaConf.to_container(cfg.device.specs, resolve=True)
         },
+        'crypto_provider': get_provider().name,
         'benchmarks': benchmark_results,
+        'benchmark_stats': benchmark.stats,
+        'environment': benchmark.environment,
         'computational_cost': {
             'vehicle_ms': comp_cost['vehicle'],
             'fog_node_ms': comp_cost['fog_node'],
             'cloud_server_ms': comp_cost['cloud_server'],
             'total_ms': comp_cost['total'],
-            'breakdown': comp_cost['breakdown']
+            'breakdown': comp_cost['breakdown'],
+            'operation_counts': comp_cost.get('operation_counts'),
         },
         'communication_cost': {
             'M1_bits': comm_cost['M1'],
@@ -74,6 +80,11 @@ def main(cfg: DictConfig):
         json.dump(results, f, indent=2)
     
     print(f"\nResults saved to: {output_file}")
+    
+    # 5. Append to the benchmark history
+    if cfg.get('history_file'):
+        record = append_run(cfg.history_file, results)
+        print(f"Run {record['run_id']} appended to: {cfg.history_file}")
     print("\n" + "="*60)
     print("SIMULATION COMPLETE")
     print("="*60 + "\n")
@@ -0,0 +1,85 @@
+import math
+import statistics
+from typing import Dict, List
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    # Continued fraction for the regularized incomplete beta function (Lentz's method)
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= d * c
+        if abs(d * c - 1.0) < 1e-12:
+            break
+    return result
+
+
+def _betainc(a: float, b: float, x: float) -> float:
+
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+
+def t_cdf(t: float, df: float) -> float:
+    # Student's t distribution
+    tail = 0.5 * _betainc(df / 2.0, 0.5, df / (df + t * t))
+    return 1.0 - tail if t > 0 else tail
+
+
+def t_ppf(p: float, df: float) -> float:
+    # Inverse of t_cdf by bisection
+    low, high = -1e3, 1e3
+    for _ in range(200):
+        mid = (low + high) / 2.0
+        if t_cdf(mid, df) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2.0
+
+
+def reject_outliers(samples: List[float], k: float) -> List[float]:
+    # Tukey's fences: drops samples more than k interquartile ranges outside the quartiles
+    if k is None or len(samples) < 4:
+        return list(samples)
+    q1, _, q3 = statistics.quantiles(samples, n=4, method='inclusive')
+    low, high = q1 - k * (q3 - q1), q3 + k * (q3 - q1)
+    return [s for s in samples if low <= s <= high]
+
+
+def summarize_samples(samples: List[float], confidence: float = 0.95, outlier_k: float = 1.5) -> Dict[str, float]:
+    # Statistics over the samples left after outlier rejection; ci_low/ci_high bound the
+    # mean with a Student's t interval
+    kept = reject_outliers(samples, outlier_k)
+    n = len(kept)
+    mean = statistics.mean(kept)
+    stddev = statistics.stdev(kept) if n > 1 else 0.0
+    half_width = t_ppf(0.5 + confidence / 2.0, n - 1) * stddev / math.sqrt(n) if n > 1 else 0.0
+    cuts = statistics.quantiles(kept, n=100, method='inclusive') if n > 1 else [mean] * 99
+    return {
+        'mean': mean,
+        'stddev': stddev,
+        'p50': cuts[49],
+        'p90': cuts[89],
+        'p99': cuts[98],
+        'min': min(kept),
+        'max': max(kept),
+        'ci_low': mean - half_width,
+        'ci_high': mean + half_width,
+        'samples': n,
+        'outliers': len(samples) - n,
+    }
@@ -0,0 +1,87 @@
+import json
+import os
+import secrets
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import hydra
+from omegaconf import DictConfig, OmegaConf
+
+from scheme import CloudServer, FogNode, Vehicle
+from scheme.common import get_provider, random_nonce, set_provider
+
+
+def measure_throughput(workers: int, batch_size: int, batches: int) -> Dict[str, float]:
+    cs = CloudServer(random_nonce())
+    FID_j = secrets.token_bytes(8)
+    fog = FogNode(FID_j)
+    fog.register(cs)
+    vehicle = Vehicle(secrets.token_bytes(8), secrets.token_bytes(8))
+    vehicle.register(cs)
+
+    if workers:
+        fog.start_executor(workers)
+    try:
+        # Warm up the pool so worker start-up is not timed
+        fog.begin_sessions([vehicle.generate_m1(FID_j, fog.storage['B_j'])])
+
+        elapsed = 0.0
+        for _ in range(batches):
+            batch = [vehicle.generate_m1(FID_j, fog.storage['B_j']) for _ in range(batch_size)]
+            start = time.perf_counter()
+            fog.begin_sessions(batch)
+            elapsed += time.perf_counter() - start
+    finally:
+        fog.shutdown_executor()
+
+    handshakes = batch_size * batches
+    return {
+        'workers': workers,
+        'm1_processed': handshakes,
+        'elapsed_s': elapsed,
+        'throughput_per_s': handshakes / elapsed,
+    }
+
+
+def run_throughput(workers: List[int], batch_size: int, batches: int) -> List[Dict[str, float]]:
+    
+    return [measure_throughput(n, batch_size, batches) for n in workers]
+
+
+def print_throughput(results: List[Dict[str, float]]):
+    
+    print("\n" + "="*60)
+    print("FOG NODE THROUGHPUT VS. WORKERS")
+    print("="*60)
+    print(f"\n  CPUs available:          {os.cpu_count()}")
+    print(f"  Crypto provider:         {get_provider().name}\n")
+    baseline = results[0]['throughput_per_s']
+    for row in results:
+        label = 'in-process' if row['workers'] == 0 else f"{row['workers']} worker(s)"
+        print(f"  {label:<24} {row['throughput_per_s']:10.2f} M1/s  (x{row['throughput_per_s'] / baseline:.2f})")
+    print(f"{'-'*60}\n")
+
+
+@hydra.main(version_base=None, config_path="configs", config_name="throughput")
+def main(cfg: DictConfig):
+    if cfg.provider:
+        set_provider(cfg.provider)
+    results = run_throughput(list(cfg.workers), cfg.batch_size, cfg.batches)
+    print_throughput(results)
+
+    output_dir = Path(cfg.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / "throughput_results.json"
+    with open(output_file, 'w') as f:
+        json.dump({
+            'cpu_count': os.cpu_count(),
+            'crypto_provider': get_provider().name,
+            'results': results,
+            'configuration': OmegaConf.to_container(cfg, resolve=True),
+        }, f, indent=2)
+    print(f"Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()